@@ -0,0 +1,266 @@
+"""
+Benchmark suite for four-vector arithmetic, metrics, transformations and
+geodesic integration.
+
+Run from this directory, e.g.
+
+python benchmarks.py --output results.json
+python benchmarks.py --save-baseline baseline.json
+python benchmarks.py --baseline baseline.json --tolerance 0.25
+
+Each benchmark reports the best time per call in seconds over several
+repetitions. Results are written as JSON; if a baseline file from a previous
+run is given, benchmarks that are slower than the baseline by more than the
+relative tolerance are reported as regressions and the script exits with
+status 1.
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import sys
+import timeit
+import numpy as np
+import scipy
+import fourvector as fv
+import metric as mt
+import transformation as tf
+import worldline as wl
+from orbits import circularOrbit, radialInfall
+
+# -----------------------------------------------------------------------
+# Benchmark definitions, each function sets up its data and returns the
+# callable that is timed
+
+def fourvectorConstruction():
+  metric = mt.minkowski()
+  return lambda: fv.fourvector([1,2,3,4], metric)
+
+def observerConstruction():
+  metric = mt.schwarzschild(1.0, 10.0, 0.5*np.pi)
+  data = [1/np.sqrt(0.9),0,0,0]
+  return lambda: fv.observer(data, metric)
+
+def fourvectorAddition():
+  a = fv.fourvector([1,2,3,4], mt.minkowski())
+  b = fv.fourvector([4,3,2,1], mt.minkowski())
+  return lambda: a+b
+
+def fourvectorScaling():
+  a = fv.fourvector([1,2,3,4], mt.minkowski())
+  return lambda: 2.0*a
+
+def fourvectorInnerProduct():
+  a = fv.fourvector([1,2,3,4], mt.minkowski())
+  b = fv.fourvector([4,3,2,1], mt.minkowski())
+  return lambda: a.innerProduct(b)
+
+def fourvectorBatchInnerProduct():
+  data = np.random.default_rng(1).random((10000,4))
+  a = fv.fourvectorBatch(data, mt.minkowski())
+  return lambda: a.innerProduct()
+
+def metricScalarProduct():
+  metric = mt.schwarzschild(1.0, 10.0, 0.5*np.pi)
+  v = np.array([1,2,3,4], dtype = np.float64)
+  w = np.array([4,3,2,1], dtype = np.float64)
+  return lambda: metric.scalarProduct(v, w)
+
+def metricEqualFingerprint():
+  # Different objects, equal fingerprints
+  a = mt.schwarzschild(1.0, 10.0, 0.5*np.pi)
+  b = mt.schwarzschild(1.0, 10.0, 0.5*np.pi)
+  return lambda: a == b
+
+def metricEqualArrays():
+  # Different fingerprints, comparison of matrix elements
+  a = mt.schwarzschild(1.0, 10.0, 0.5*np.pi)
+  b = mt.schwarzschild(1.0, 11.0, 0.5*np.pi)
+  return lambda: a == b
+
+def schwarzschildUpdateCoords():
+  metric = mt.schwarzschild(1.0, 10.0, 0.5*np.pi)
+  coord = np.array([0,10.0,1.0,0])
+  return lambda: metric.updateCoords(coord)
+
+def schwarzschildEvaluateBatch():
+  coords = np.zeros((10000,4))
+  coords[:,1] = np.linspace(2.0, 50.0, 10000)
+  coords[:,2] = np.linspace(0.1, 3.0, 10000)
+  metric = mt.schwarzschild(1.0, 10.0, 0.5*np.pi)
+  return lambda: metric.evaluateBatch(coords)
+
+def boostConstruction():
+  # Uncached direction and beta generated on the fly (without allocating an
+  # array of values in the setup), so that the matrices are computed every time.
+  # A counter costs far less per call than iterating over a NumPy array.
+  direction = np.array([1.0,2.0,3.0])
+  counter = itertools.count()
+  return lambda: tf.lorentzBoost(direction, 0.1+0.8e-7*(next(counter) % 10**7))
+
+def rotationConstruction():
+  # Angle generated on the fly, so that the matrices are computed every time
+  counter = itertools.count()
+  return lambda: tf.lorentzRotation(3, 0.1+2.9e-7*(next(counter) % 10**7))
+
+def transformationComposition():
+  boost = tf.lorentzBoost(1, 0.5)
+  rotation = tf.lorentzRotation(3, 0.3)
+  return lambda: boost @ rotation
+
+def transformContraVector():
+  boost = tf.lorentzBoost(1, 0.5)
+  v = np.array([1,2,3,4], dtype = np.float64)
+  return lambda: boost.transformContraVector(v)
+
+def transformContraVectorBatch():
+  boost = tf.lorentzBoost(1, 0.5)
+  v = np.random.default_rng(1).random((10000,4))
+  return lambda: boost.transformContraVector(v)
+
+def transformCoMatrix():
+  boost = tf.lorentzBoost(1, 0.5)
+  m = np.diagflat(np.array([1,-1,-1,-1], dtype = np.float64))
+  return lambda: boost.transformCoMatrix(m)
+
+def geodesicMinkowski():
+  vel0 = fv.particle([1,0,0,0], mt.minkowski(), 1)
+  vel0.lorentzBoost(1, 0.9)
+  path = wl.worldline([0,0,0,0], vel0)
+  return lambda: path.geodesic(100, 100)
+
+def geodesicCircularOrbit():
+  path = circularOrbit(1.0, 10.0)
+  return lambda: path.geodesic(1000, 100)
+
+def geodesicRadialPhoton():
+  rs = 1.0
+  r0 = 10*rs
+  vel0 = fv.photon([1,1-rs/r0,0,0], mt.schwarzschild(rs,r0,0.5*np.pi), 1)
+  path = wl.worldline([0,r0,0.5*np.pi,0], vel0)
+  return lambda: path.geodesic(1000, 100)
+
+def geodesicHorizonInfall():
+  # Radial infall from rest, stopped just outside of the horizon
+  rs = 1.0
+  path = radialInfall(rs, 5*rs)
+  events = [wl.horizonEvent(rs, 1.0e-6)]
+  return lambda: path.geodesic(100, 100, events = events, rtol = 1.0e-8, atol = 1.0e-10)
+
+benchmarks = {
+  'fourvector.construction': fourvectorConstruction,
+  'observer.construction': observerConstruction,
+  'fourvector.add': fourvectorAddition,
+  'fourvector.scale': fourvectorScaling,
+  'fourvector.innerProduct': fourvectorInnerProduct,
+  'fourvectorBatch.innerProduct[10000]': fourvectorBatchInnerProduct,
+  'metric.scalarProduct': metricScalarProduct,
+  'metric.eq.fingerprint': metricEqualFingerprint,
+  'metric.eq.arrays': metricEqualArrays,
+  'schwarzschild.updateCoords': schwarzschildUpdateCoords,
+  'schwarzschild.evaluateBatch[10000]': schwarzschildEvaluateBatch,
+  'transformation.boost': boostConstruction,
+  'transformation.rotation': rotationConstruction,
+  'transformation.compose': transformationComposition,
+  'transformation.contraVector': transformContraVector,
+  'transformation.contraVector[10000]': transformContraVectorBatch,
+  'transformation.coMatrix': transformCoMatrix,
+  'geodesic.minkowski': geodesicMinkowski,
+  'geodesic.schwarzschild.circular': geodesicCircularOrbit,
+  'geodesic.schwarzschild.radialPhoton': geodesicRadialPhoton,
+  'geodesic.schwarzschild.horizonInfall': geodesicHorizonInfall,
+}
+
+# -----------------------------------------------------------------------
+
+def run(names = None, repeat = 5, minTime = 0.2):
+  """
+  Runs the given benchmarks (default: all) and returns a dictionary with
+  the best and median time per call in seconds and the number of calls per
+  repetition for each benchmark. The number of calls is chosen so that one
+  repetition takes at least minTime seconds.
+  """
+  assert (repeat > 0), "repeat must be 1 or larger"
+  if names is None:
+    names = list(benchmarks.keys())
+
+  results = {}
+  for name in names:
+    assert (name in benchmarks), "Unknown benchmark " + name
+    timer = timeit.Timer(benchmarks[name]())
+    number = 1
+    while timer.timeit(number) < minTime:
+      number *= 2
+    times = np.array(timer.repeat(repeat = repeat, number = number))/number
+    results[name] = {'best': float(np.min(times)), 'median': float(np.median(times)), 'number': number}
+  return results
+
+def compare(results, baseline, tolerance = 0.25):
+  """
+  Compares benchmark results with a baseline, both as returned by run, and
+  returns a list of tuples (name, ratio) for all benchmarks whose best time
+  exceeds the baseline by more than the relative tolerance. Benchmarks that
+  are missing in either of them are ignored.
+  """
+  assert (tolerance >= 0), "Tolerance must be >= 0"
+  regressions = []
+  for name, result in results.items():
+    if name in baseline:
+      ratio = result['best']/baseline[name]['best']
+      if ratio > 1+tolerance:
+        regressions.append((name, ratio))
+  return regressions
+
+def environment():
+  """
+  Returns versions of Python and numerical libraries, stored with the results
+  """
+  return {'python': platform.python_version(), 'numpy': np.__version__, 'scipy': scipy.__version__,
+          'machine': platform.machine(), 'processor': platform.processor()}
+
+def main(args = None):
+  parser = argparse.ArgumentParser(description = 'Run benchmarks and compare them against a baseline')
+  parser.add_argument('names', nargs = '*', help = 'benchmarks to run (default: all)')
+  parser.add_argument('--list', action = 'store_true', help = 'list benchmarks and exit')
+  parser.add_argument('--repeat', type = int, default = 5, help = 'number of repetitions')
+  parser.add_argument('--min-time', type = float, default = 0.2, help = 'minimum time per repetition in seconds')
+  parser.add_argument('--output', help = 'write results to JSON file')
+  parser.add_argument('--save-baseline', help = 'write results to JSON file as new baseline')
+  parser.add_argument('--baseline', help = 'compare results with baseline JSON file')
+  parser.add_argument('--tolerance', type = float, default = 0.25, help = 'relative slowdown that counts as regression')
+  options = parser.parse_args(args)
+
+  if options.list:
+    for name in benchmarks:
+      print(name)
+    return 0
+
+  results = run(options.names if options.names else None, options.repeat, options.min_time)
+  output = {'environment': environment(), 'benchmarks': results}
+  for filename in [options.output, options.save_baseline]:
+    if filename is not None:
+      with open(filename, 'w') as f:
+        json.dump(output, f, indent = 2)
+
+  baseline = None
+  if options.baseline is not None:
+    with open(options.baseline) as f:
+      baseline = json.load(f)['benchmarks']
+
+  for name, result in results.items():
+    line = '{:40s} {:12.3e} s'.format(name, result['best'])
+    if baseline is not None and name in baseline:
+      line += '   x{:.2f}'.format(result['best']/baseline[name]['best'])
+    print(line)
+
+  if baseline is not None:
+    regressions = compare(results, baseline, options.tolerance)
+    for name, ratio in regressions:
+      print('REGRESSION: {} is {:.2f} times slower than baseline'.format(name, ratio))
+    if regressions:
+      return 1
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
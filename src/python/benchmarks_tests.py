@@ -0,0 +1,36 @@
+import json
+import benchmarks as bm
+
+def test_benchmarks():
+
+  # All benchmarks must set up and run
+  for name, setup in bm.benchmarks.items():
+    setup()()
+
+  results = bm.run(['fourvector.add', 'metric.eq.fingerprint'], repeat = 2, minTime = 0.001)
+  assert (sorted(results.keys()) == ['fourvector.add', 'metric.eq.fingerprint']), "Unexpected benchmarks"
+  for result in results.values():
+    assert (result['best'] > 0 and result['best'] <= result['median']), "Unexpected timings"
+    assert (result['number'] >= 1), "Unexpected number of calls"
+
+  # Regressions are benchmarks slower than baseline by more than the tolerance
+  baseline = {'fourvector.add': {'best': 1.0}, 'metric.eq.fingerprint': {'best': 1.0}, 'other': {'best': 1.0}}
+  results = {'fourvector.add': {'best': 1.2}, 'metric.eq.fingerprint': {'best': 1.3}, 'new': {'best': 5.0}}
+  assert (bm.compare(results, baseline, 0.25) == [('metric.eq.fingerprint', 1.3)]), "Unexpected regressions"
+  assert (bm.compare(results, baseline, 0.5) == []), "Unexpected regressions"
+
+def test_benchmarksMain(tmp_path):
+  baseline = tmp_path / 'baseline.json'
+  output = tmp_path / 'results.json'
+  args = ['fourvector.add', '--repeat', '1', '--min-time', '0.001']
+  assert (bm.main(args + ['--save-baseline', str(baseline)]) == 0), "Unexpected exit status"
+  with open(baseline) as f:
+    data = json.load(f)
+  assert ('fourvector.add' in data['benchmarks'] and 'numpy' in data['environment']), "Unexpected JSON output"
+
+  # Fake a much faster baseline to provoke a regression
+  data['benchmarks']['fourvector.add']['best'] *= 1.0e-3
+  with open(baseline, 'w') as f:
+    json.dump(data, f)
+  assert (bm.main(args + ['--baseline', str(baseline), '--output', str(output)]) == 1), "Expected regression"
+  assert (output.exists()), "Expected results file"
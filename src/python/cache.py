@@ -0,0 +1,188 @@
+"""
+Persistent on-disk cache for results of geodesic integrations, see
+worldline.geodesic. Results are addressed by a hash of everything that
+determines them: initial coordinates and velocity, metric parameters,
+integration limits, events and solver settings. They are stored as
+uncompressed NumPy arrays in .npz files in a local directory, which is kept
+below a maximum size by evicting the least recently used results.
+
+Usage:
+
+results = cache.geodesicCache('geodesics')
+path.geodesic(1000, 100, denseOutput = False, cache = results)
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+import zipfile
+import numpy as np
+
+# Increment when the stored format or the integration changes, so that
+# stale results are not reused
+formatVersion = 1
+
+def _keyString(value):
+  """
+  Returns an exact, unambiguous string representation of nested tuples and
+  lists of strings, numbers and arrays for hashing
+  """
+  if isinstance(value, (tuple, list)):
+    return '(' + ','.join(_keyString(x) for x in value) + ')'
+  if isinstance(value, np.ndarray):
+    return 'array' + str(value.shape) + _keyString([float(x) for x in value.ravel()])
+  if isinstance(value, (bool, np.bool_, type(None))):
+    return repr(bool(value)) if value is not None else 'None'
+  if isinstance(value, (int, np.integer)):
+    return repr(int(value))
+  if isinstance(value, (float, np.floating)):
+    return float(value).hex()
+  assert (isinstance(value, str)), "Unsupported type in cache key"
+  return repr(value)
+
+def geodesicKey(coord0, velocity0, properTime, nSteps, events, options):
+  """
+  Returns the hash of a geodesic integration as hex string, see
+  worldline.geodesic for the arguments, options is a dictionary of solver
+  settings. Returns None if the result cannot be cached, i.e. if the metric
+  or one of the events cannot be identified across processes.
+  """
+  metricKey = velocity0.getMetric().getCacheKey()
+  if metricKey is None:
+    return None
+  eventKeys = []
+  for event in events:
+    eventKey = event.getCacheKey() if hasattr(event, 'getCacheKey') else None
+    if eventKey is None:
+      return None
+    eventKeys.append(eventKey)
+
+  key = (formatVersion, np.asarray(coord0, dtype = np.float64), np.asarray(velocity0.vector, dtype = np.float64),
+         type(velocity0).__name__, metricKey, float(properTime), nSteps, tuple(eventKeys),
+         tuple((name, options[name]) for name in sorted(options)))
+  return hashlib.sha256(_keyString(key).encode()).hexdigest()
+
+class geodesicCache:
+  """
+  Directory of cached results with a maximum total size in bytes. Results
+  are files named after their key; reading a result updates its
+  modification time, which is used to evict the least recently used
+  results. Writes are atomic, so that several processes can share a cache.
+  """
+
+  def __init__(self, directory, maxBytes = 2**30, staleSeconds = 3600):
+    assert (maxBytes > 0), "Maximum cache size must be > 0"
+    assert (staleSeconds > 0), "Age of stale temporary files must be > 0"
+    self.directory = directory
+    self.maxBytes = maxBytes
+    # Temporary files of stores that did not finish within this time, e.g.
+    # from killed processes, are removed during eviction
+    self.staleSeconds = staleSeconds
+    os.makedirs(directory, exist_ok = True)
+
+  def filename(self, key):
+    return os.path.join(self.directory, key + '.npz')
+
+  def load(self, key):
+    """
+    Returns a dictionary with the arrays stored under given key, or None if
+    there is no such result
+    """
+    filename = self.filename(key)
+    try:
+      with np.load(filename) as data:
+        result = {name: data[name] for name in data.files}
+    except FileNotFoundError:
+      # Missing or concurrently evicted result
+      return None
+    except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+      # Corrupt result, e.g. an empty or truncated file after a crash
+      try:
+        os.remove(filename)
+      except OSError:
+        pass
+      return None
+    try:
+      os.utime(filename)
+    except OSError:
+      pass
+    return result
+
+  def store(self, key, arrays):
+    """
+    Stores a dictionary of arrays under given key, and evicts least recently
+    used results if the cache exceeds its maximum size
+    """
+    handle, temporary = tempfile.mkstemp(dir = self.directory, suffix = '.tmp')
+    try:
+      with os.fdopen(handle, 'wb') as f:
+        np.savez(f, **arrays)
+        # Make sure the data is on disk before the result becomes visible
+        f.flush()
+        os.fsync(f.fileno())
+      os.replace(temporary, self.filename(key))
+    except BaseException:
+      os.remove(temporary)
+      raise
+    self.evict()
+
+  def entries(self, suffix = '.npz'):
+    """
+    Returns a list of tuples (modification time, size, filename) of all
+    results, or of all temporary files of unfinished stores with suffix
+    '.tmp', least recently used first
+    """
+    entries = []
+    for name in os.listdir(self.directory):
+      if name.endswith(suffix):
+        filename = os.path.join(self.directory, name)
+        try:
+          info = os.stat(filename)
+        except OSError:
+          continue
+        entries.append((info.st_mtime, info.st_size, filename))
+    return sorted(entries)
+
+  def size(self):
+    """
+    Returns the total size of all results and temporary files in bytes
+    """
+    return sum(size for mtime, size, filename in self.entries() + self.entries('.tmp'))
+
+  def evict(self):
+    """
+    Removes stale temporary files and least recently used results until the
+    cache fits into its maximum size
+    """
+    now = time.time()
+    temporary = 0
+    for mtime, size, filename in self.entries('.tmp'):
+      if now-mtime > self.staleSeconds:
+        try:
+          os.remove(filename)
+        except OSError:
+          pass
+      else:
+        temporary += size
+
+    entries = self.entries()
+    total = temporary + sum(size for mtime, size, filename in entries)
+    for mtime, size, filename in entries:
+      if total <= self.maxBytes:
+        break
+      try:
+        os.remove(filename)
+      except OSError:
+        pass
+      total -= size
+
+  def clear(self):
+    """
+    Removes all results and temporary files
+    """
+    for mtime, size, filename in self.entries() + self.entries('.tmp'):
+      try:
+        os.remove(filename)
+      except OSError:
+        pass
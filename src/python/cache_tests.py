@@ -0,0 +1,127 @@
+import os
+import numpy as np
+import pytest
+import cache as ch
+import worldline as wl
+import fourvector as fv
+import metric as mt
+import instrumentation as ins
+from orbits import radialInfall
+
+def test_geodesicKey():
+  rs = 1.0
+  r0 = 5*rs
+  options = {'method': 'RK45', 'rtol': 1.0e-3, 'atol': 1.0e-6, 'denseOutput': False, 'project': False}
+  events = [wl.horizonEvent(rs)]
+  path = radialInfall(rs, r0)
+  key = ch.geodesicKey(path.coord0, path.velocity0, 100, 10, events, options)
+
+  # Keys only depend on values, not on objects
+  other = radialInfall(rs, r0)
+  assert (ch.geodesicKey(other.coord0, other.velocity0, 100, 10, [wl.horizonEvent(rs)], dict(options)) == key), "Expected same key"
+
+  # Every input changes the key
+  keys = [ch.geodesicKey(path.coord0, path.velocity0, 101, 10, events, options),
+          ch.geodesicKey(path.coord0, path.velocity0, 100, 11, events, options),
+          ch.geodesicKey(path.coord0, path.velocity0, 100, None, events, options),
+          ch.geodesicKey(path.coord0, path.velocity0, 100, 10, [], options),
+          ch.geodesicKey(path.coord0, path.velocity0, 100, 10, [wl.horizonEvent(rs, 0.1)], options),
+          ch.geodesicKey(path.coord0, path.velocity0, 100, 10, events, dict(options, rtol = 1.0e-4)),
+          ch.geodesicKey(path.coord0+1.0e-12, path.velocity0, 100, 10, events, options)]
+  other = radialInfall(1.1*rs, r0)
+  keys.append(ch.geodesicKey(other.coord0, other.velocity0, 100, 10, events, options))
+  assert (len(set(keys + [key])) == len(keys)+1), "Expected different keys"
+
+  # Symbolic metrics are identified by exact parameters and expressions
+  sympy = pytest.importorskip("sympy")
+  t, r, theta, phi, radius = sympy.symbols('t r theta phi r_s')
+  matrix = sympy.diag(1-radius/r, -1/(1-radius/r), -r**2, -r**2*sympy.sin(theta)**2)
+  keys = set()
+  for value in [1.0, 1.0+1.0e-15]:
+    metric = mt.symbolicMetric('Schwarzschild', (t, r, theta, phi), matrix, [0, r0, 0.5*np.pi, 0], {'r_s': value})
+    keys.add(ch.geodesicKey(path.coord0, fv.fourvector(path.velocity0.vector, metric), 100, 10, events, options))
+  assert (len(keys) == 2 and None not in keys), "Expected different keys for different parameters"
+
+  # Metrics and events that cannot be identified across processes are not cached
+  assert (ch.geodesicKey(path.coord0, path.velocity0, 100, 10, [wl.geodesicEvent(lambda s, x: x[1]-2, 'r')], options) is None), "Expected no key"
+  table = mt.tabulatedMetric(mt.schwarzschild(rs, r0, 0.5*np.pi), {1: np.linspace(2, 6, 5), 2: np.linspace(1, 2, 3)})
+  velocity = fv.fourvector([1,0,0,0], table)
+  assert (ch.geodesicKey(path.coord0, velocity, 100, 10, [], options) is None), "Expected no key"
+
+def test_geodesicCache(tmp_path):
+  rs = 1.0
+  r0 = 5*rs
+  results = ch.geodesicCache(str(tmp_path / 'geodesics'))
+
+  # The first integration stores its results, the second one reads them
+  path = radialInfall(rs, r0)
+  with ins.collect() as stats:
+    path.geodesic(100, 50, events = [wl.horizonEvent(rs, 0.01)], denseOutput = False, cache = results)
+  assert (stats['cache.misses'] == 1 and stats['geodesicRHS'] > 0), "Expected integration"
+  assert (len(results.entries()) == 1), "Expected stored result"
+  cached = radialInfall(rs, r0)
+  with ins.collect() as stats:
+    cached.geodesic(100, 50, events = [wl.horizonEvent(rs, 0.01)], denseOutput = False, cache = results)
+  assert (stats['cache.hits'] == 1 and stats['geodesicRHS'] == 0), "Expected no integration"
+  assert (cached.stats['cache.hits'] == 1 and cached.stats['solver.nfev'] == path.stats['solver.nfev']), "Expected cached statistics"
+  assert (np.array_equal(cached.curveparam, path.curveparam)), "Unexpected proper times"
+  assert (np.array_equal(cached.coords, path.coords)), "Unexpected coordinates"
+  assert (np.array_equal(cached.velocities.vectors, path.velocities.vectors)), "Unexpected velocities"
+  assert (cached.velocities[-1].metric == path.velocities[-1].metric), "Unexpected metric"
+  assert (cached.event == 'horizon' and cached.eventTime == path.eventTime), "Unexpected event"
+  assert (np.array_equal(cached.endState, path.endState) and cached.lastStep == path.lastStep), "Unexpected final state"
+  assert (cached.integralCurve is None), "Dense output is not cached"
+
+  # Cached results without event can be extended
+  path.geodesic(5, 10, denseOutput = False, cache = results)
+  cached.geodesic(5, 10, denseOutput = False, cache = results)
+  assert (cached.event is None and cached.stats['cache.hits'] == 1), "Expected cached result without event"
+  path.extend(1, 5)
+  cached.extend(1, 5)
+  assert (np.array_equal(cached.coords, path.coords)), "Unexpected extended coordinates"
+
+  # Dense output cannot be cached
+  with pytest.raises(AssertionError):
+    path.geodesic(5, 10, cache = results)
+
+def test_cacheEviction(tmp_path):
+  results = ch.geodesicCache(str(tmp_path), maxBytes = 10**6)
+  arrays = {'data': np.zeros(1000)}
+  for i, key in enumerate(['a', 'b', 'c']):
+    results.store(key, arrays)
+    os.utime(results.filename(key), (1000+i, 1000+i))
+  size = os.path.getsize(results.filename('a'))
+  assert (results.size() == 3*size), "Unexpected cache size"
+
+  # Reading a result makes it the most recently used one
+  assert (np.array_equal(results.load('a')['data'], arrays['data'])), "Unexpected result"
+  assert (results.load('d') is None), "Expected missing result"
+  results.maxBytes = 2*size
+  results.evict()
+  assert (results.load('b') is None), "Least recently used result should be evicted"
+  assert (results.load('a') is not None and results.load('c') is not None), "Expected remaining results"
+
+  # Storing beyond the maximum size evicts automatically
+  results.store('d', arrays)
+  assert (results.size() <= 2*size and results.load('d') is not None), "Expected eviction when storing"
+
+  # Temporary files count towards the size, stale ones are removed
+  temporary = os.path.join(str(tmp_path), 'unfinished.tmp')
+  with open(temporary, 'wb') as f:
+    f.write(bytes(100))
+  assert (results.size() == 2*size+100), "Expected temporary file in cache size"
+  results.evict()
+  assert (os.path.exists(temporary)), "Recent temporary files belong to running stores"
+  os.utime(temporary, (1000, 1000))
+  results.evict()
+  assert (not os.path.exists(temporary)), "Expected removal of stale temporary file"
+
+  # Corrupt results, e.g. after a crash, are misses and are removed
+  for content in [b'', b'PK\x03\x04truncated']:
+    with open(results.filename('e'), 'wb') as f:
+      f.write(content)
+    assert (results.load('e') is None), "Expected miss for corrupt result"
+    assert (not os.path.exists(results.filename('e'))), "Expected removal of corrupt result"
+
+  results.clear()
+  assert (results.size() == 0), "Expected empty cache"
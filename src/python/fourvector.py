@@ -1,9 +1,48 @@
 import numpy as np
 import transformation as tf
 import metric as mt
-import copy
 
-class fourvector:
+class sharedMetric:
+  """
+  Mixin for vectors that carry a reference to a metric. The metric is shared
+  as a read-only snapshot and only copied once it gets modified, which
+  enables independent transformations of vectors that were created from
+  the same metric (copy-on-write).
+  """
+
+  @property
+  def metric(self):
+    """
+    Metric of this object. Callers may modify the returned metric, so a
+    shared snapshot is replaced by a private, writeable copy on first access.
+    """
+    if self._metric.isFrozen():
+      self._metric = self._metric.copy()
+    return self._metric
+
+  @metric.setter
+  def metric(self, metric):
+    assert (isinstance(metric, mt.metric)), "Argument must be metric type"
+    self._metric = metric.snapshot()
+
+  def getMetric(self):
+    """
+    Returns the metric of this object for read-only access, without replacing
+    a shared snapshot by a private copy. The returned metric must not be
+    modified, use the metric property or updateCoords for that.
+    """
+    return self._metric
+
+  def updateCoords(self, coord):
+    """
+    Evaluates the metric of this object at given coordinates. The shared
+    metric is copied before it is modified.
+    """
+    metric = self._metric.copy()
+    metric.updateCoords(coord)
+    self._metric = metric.freeze()
+
+class fourvector(sharedMetric):
   """
   Defines a contravariant four-vector for relativistic computations.
   Each four-vector carries a reference to a metric which is used for
@@ -22,9 +61,8 @@ class fourvector:
       assert (len(data) == 4), "Input vector must have 4 components"
       self.vector = np.array(data, dtype = np.float64)
 
-    # Get an independent copy of the metric to enable independent transformations
-    assert (isinstance(metric, mt.metric)), "Argument must be metric type"
-    self.metric = copy.deepcopy(metric)
+    # Shares a read-only snapshot of the metric, see sharedMetric
+    self.metric = metric
 
   #
   # Operator definitions
@@ -33,12 +71,12 @@ class fourvector:
   # Only implement essential operators and derive the others from these
   def __add__(self, other):
     assert(isinstance(other, fourvector)), "Argument must be fourvector type"
-    assert(self.metric == other.metric), "Four-vectors must have same metric"
-    return fourvector(self.vector+other.vector, self.metric)
+    assert(self._metric == other._metric), "Four-vectors must have same metric"
+    return fourvector(self.vector+other.vector, self._metric)
 
   def __mul__(self, other):
     assert(isinstance(other, (int,float))), "Argument must be int or float type"
-    return fourvector(self.vector*other, self.metric)
+    return fourvector(self.vector*other, self._metric)
 
   def __eq__(self, other):
     """
@@ -47,7 +85,7 @@ class fourvector:
     """
     result = isinstance(other, fourvector)
     result = result and np.array_equal(self.vector, other.vector)
-    result = result and self.metric == other.metric
+    result = result and self._metric == other._metric
     return result
 
   def __sub__(self, other):
@@ -66,7 +104,7 @@ class fourvector:
     return self.vector[index]
 
   def __str__(self):
-    return self.vector.__str__() + " Metric: " + self.metric.name
+    return self.vector.__str__() + " Metric: " + self._metric.name
 
   #
   # Methods
@@ -80,11 +118,11 @@ class fourvector:
     g(v,w)
     """
     if other is None:
-      return self.metric.scalarProduct(self.vector, self.vector)
+      return self._metric.scalarProduct(self.vector, self.vector)
     else:
       assert(isinstance(other, fourvector)), "Argument must be fourvector type"
-      assert(self.metric == other.metric), "Four-vectors must have same metric"
-      return self.metric.scalarProduct(self.vector, other.vector)
+      assert(self._metric == other._metric), "Four-vectors must have same metric"
+      return self._metric.scalarProduct(self.vector, other.vector)
 
   def norm(self):
     return np.sqrt(np.abs(self.innerProduct()))
@@ -98,21 +136,26 @@ class fourvector:
   def isSpaceLike(self):
     return self.innerProduct() < -self.tolerance
 
+  def lorentzTransform(self, transformation):
+    """
+    Apply a Lorentz transformation, e.g. a composition of several boosts and
+    rotations
+    """
+    assert (self._metric.getName() == 'Minkowski'), "Lorentz transformations require Minkowski metric"
+    assert (isinstance(transformation, tf.transformation)), "Argument must be transformation type"
+    self.vector = transformation.transformContraVector(self.vector)
+
   def lorentzRotate(self, axis, angle):
     """
     Spatial rotation around given axis with given angle
     """
-    assert (self.metric.getName() == 'Minkowski'), "Lorentz transformations require Minkowski metric"
-    rot = tf.lorentzRotation(axis, angle)
-    self.vector = rot.transformContraVector(self.vector)
+    self.lorentzTransform(tf.lorentzRotation(axis, angle))
 
   def lorentzBoost(self, axis, beta):
     """
     Boost into frame that moves along given axis at speed beta = v/c
     """
-    assert (self.metric.getName() == 'Minkowski'), "Lorentz transformations require Minkowski metric"
-    boost = tf.lorentzBoost(axis, beta)
-    self.vector = boost.transformContraVector(self.vector)
+    self.lorentzTransform(tf.lorentzBoost(axis, beta))
 
 class observer(fourvector):
   """
@@ -140,7 +183,7 @@ class observer(fourvector):
 	
 	g(v,x) = 0
 	"""
-    assert (self.metric == other.metric), "Four-vectors must have same metric"
+    assert (self._metric == other._metric), "Four-vectors must have same metric"
     return self/self.innerProduct(other) - other
 
   def speed(self, other):
@@ -149,7 +192,7 @@ class observer(fourvector):
 	as seen by another observer x
 	"""
     assert (isinstance(other, fourvector)), "Argument must be fourvector type"
-    assert (self.metric == other.metric), "Four-vectors must have same metric"
+    assert (self._metric == other._metric), "Four-vectors must have same metric"
     return np.sqrt(-self.relativeVelocity(other).innerProduct())
 
 class particle(observer):
@@ -164,7 +207,7 @@ class particle(observer):
 
   def energy(self, other):
     assert (isinstance(other, fourvector)), "Argument must be fourvector type"
-    assert (self.metric == other.metric), "Four-vectors must have same metric"
+    assert (self._metric == other._metric), "Four-vectors must have same metric"
     return self.restmass*self.innerProduct(other)
 
 class photon(fourvector):
@@ -181,3 +224,144 @@ class photon(fourvector):
     assert (self.isLightLike()), "Photons must be light-like"
     assert (isinstance(energy, (int,float))), "Argument must be int or float type"
     self.energy = energy
+
+class fourvectorBatch(sharedMetric):
+  """
+  Defines a batch of N contravariant four-vectors that share a single metric.
+  The vectors are stored as rows of one (N,4) array, so that inner products,
+  norms and causal classification of all vectors are computed in single
+  vectorised calls.
+  """
+
+  # Same light-like threshold as for individual four-vectors
+  tolerance = fourvector.tolerance
+
+  # Let NumPy defer to the reflected operators of this class, e.g. for
+  # array*batch
+  __array_ufunc__ = None
+
+  def __init__(self, data, metric):
+    self.vectors = np.array(data, dtype = np.float64)
+    assert (self.vectors.ndim == 2 and self.vectors.shape[1] == 4), "Input vectors must have shape (N,4)"
+
+    # Shares a read-only snapshot of the metric, see sharedMetric
+    self.metric = metric
+
+  #
+  # Operator definitions
+  #
+
+  def __add__(self, other):
+    """
+    Adds another batch of the same length row by row, or a single fourvector
+    to every row
+    """
+    assert(isinstance(other, (fourvectorBatch, fourvector))), "Argument must be fourvectorBatch or fourvector type"
+    assert(self._metric == other._metric), "Four-vectors must have same metric"
+    if isinstance(other, fourvectorBatch):
+      assert(len(self) == len(other)), "Batches must have same length"
+      return fourvectorBatch(self.vectors+other.vectors, self._metric)
+    return fourvectorBatch(self.vectors+other.vector, self._metric)
+
+  def __mul__(self, other):
+    """
+    Multiplies all vectors with a number, or each vector with its own number
+    if an array of shape (N,) is given
+    """
+    if isinstance(other, np.ndarray):
+      assert(other.shape == (len(self),)), "Factor array must have shape (N,)"
+      return fourvectorBatch(self.vectors*other[:,np.newaxis], self._metric)
+    assert(isinstance(other, (int,float))), "Argument must be int, float or array type"
+    return fourvectorBatch(self.vectors*other, self._metric)
+
+  def __eq__(self, other):
+    """
+    Requires that operand is a fourvectorBatch with identical components and
+	numerically near-identical metric
+    """
+    result = isinstance(other, fourvectorBatch)
+    result = result and np.array_equal(self.vectors, other.vectors)
+    result = result and self._metric == other._metric
+    return result
+
+  def __sub__(self, other):
+    return self.__add__(other*(-1.))
+
+  def __rmul__(self, other):
+    return self.__mul__(other)
+
+  def __truediv__(self, other):
+    return self.__mul__(1./other)
+
+  def __ne__(self, other):
+    return not self.__eq__(other)
+
+  def __len__(self):
+    return self.vectors.shape[0]
+
+  def __getitem__(self, index):
+    """
+    Returns a single fourvector for an integer index, and a new batch for
+    slices and index arrays
+    """
+    if isinstance(index, (int, np.integer)):
+      return fourvector(self.vectors[index], self._metric)
+    return fourvectorBatch(self.vectors[index], self._metric)
+
+  def __str__(self):
+    return self.vectors.__str__() + " Metric: " + self._metric.name
+
+  #
+  # Methods
+  #
+
+  def innerProduct(self, other = None):
+    """
+    Return array of inner products of each vector with itself,
+    g(v_n,v_n)
+    or with the corresponding vector of another batch,
+    g(v_n,w_n)
+    or with a single fourvector,
+    g(v_n,w)
+    """
+    if other is None:
+      return self._metric.scalarProducts(self.vectors, self.vectors)
+    assert(isinstance(other, (fourvectorBatch, fourvector))), "Argument must be fourvectorBatch or fourvector type"
+    assert(self._metric == other._metric), "Four-vectors must have same metric"
+    if isinstance(other, fourvectorBatch):
+      assert(len(self) == len(other)), "Batches must have same length"
+      return self._metric.scalarProducts(self.vectors, other.vectors)
+    return self._metric.scalarProducts(self.vectors, other.vector)
+
+  def norm(self):
+    return np.sqrt(np.abs(self.innerProduct()))
+
+  def isTimeLike(self):
+    return self.innerProduct() > self.tolerance
+
+  def isLightLike(self):
+    return np.abs(self.innerProduct()) < self.tolerance
+
+  def isSpaceLike(self):
+    return self.innerProduct() < -self.tolerance
+
+  def lorentzTransform(self, transformation):
+    """
+    Apply a Lorentz transformation, e.g. a composition of several boosts and
+    rotations, to all vectors in a single matrix multiplication
+    """
+    assert (self._metric.getName() == 'Minkowski'), "Lorentz transformations require Minkowski metric"
+    assert (isinstance(transformation, tf.transformation)), "Argument must be transformation type"
+    self.vectors = transformation.transformContraVector(self.vectors)
+
+  def lorentzRotate(self, axis, angle):
+    """
+    Spatial rotation of all vectors around given axis with given angle
+    """
+    self.lorentzTransform(tf.lorentzRotation(axis, angle))
+
+  def lorentzBoost(self, axis, beta):
+    """
+    Boost all vectors into frame that moves along given axis at speed beta = v/c
+    """
+    self.lorentzTransform(tf.lorentzBoost(axis, beta))
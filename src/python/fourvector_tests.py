@@ -1,6 +1,7 @@
 import numpy as np
 import fourvector as fv
 import metric as mt
+import transformation as tf
 
 def test_fourvector():
 
@@ -110,3 +111,102 @@ def test_particle():
   # Observer in rest frame
   observer = fv.observer([1,0,0,0], metric)
   assert (np.isclose(particle.energy(observer), gamma*mass)), "Expected energy gamma*mass"
+
+def test_fourvectorBatch():
+
+  metric = mt.minkowski()
+
+  # Time-like, light-like and space-like vectors in one batch
+  data = np.array([[1,0,0,0],[1,1,0,0],[0,1,0,0],[2,0,1,0]], dtype = np.float64)
+  batch = fv.fourvectorBatch(data, metric)
+  assert (len(batch) == 4), "Unexpected batch length"
+
+  # Results must agree with individual four-vectors
+  for i in range(len(batch)):
+    v = fv.fourvector(data[i], metric)
+    assert (batch[i] == v), "Unexpected element"
+    assert (np.isclose(batch.innerProduct()[i], v.innerProduct())), "Unexpected inner product"
+    assert (np.isclose(batch.norm()[i], v.norm())), "Unexpected norm"
+    assert (batch.isTimeLike()[i] == v.isTimeLike()), "Unexpected time-like classification"
+    assert (batch.isLightLike()[i] == v.isLightLike()), "Unexpected light-like classification"
+    assert (batch.isSpaceLike()[i] == v.isSpaceLike()), "Unexpected space-like classification"
+
+  # Check operators
+  other = fv.fourvectorBatch(np.ones((4,4)), metric)
+  assert (np.allclose((batch+other).vectors, data+1)), "Unexpected result"
+  assert (np.allclose((batch-other).vectors, data-1)), "Unexpected result"
+  assert (np.allclose((batch*2).vectors, 2*data)), "Unexpected result"
+  assert (np.allclose((-3.4*batch).vectors, -3.4*data)), "Unexpected result"
+  assert (np.allclose((batch/2).vectors, data/2)), "Unexpected result"
+  factors = np.array([1,2,3,4], dtype = np.float64)
+  assert (np.allclose((batch*factors).vectors, data*factors[:,np.newaxis])), "Unexpected result"
+  assert (np.allclose((factors*batch).vectors, data*factors[:,np.newaxis])), "Unexpected result"
+  assert (np.allclose((batch+fv.fourvector([1,0,0,0], metric)).vectors[:,0], data[:,0]+1)), "Unexpected result"
+  assert (batch == batch), "Unexpected result"
+  assert (batch != other), "Unexpected result"
+  assert (batch[1:3] == fv.fourvectorBatch(data[1:3], metric)), "Unexpected slice"
+
+  # Inner products with other batch and single vector
+  assert (np.allclose(batch.innerProduct(other), [1,0,-1,1])), "Unexpected inner products"
+  assert (np.allclose(batch.innerProduct(fv.fourvector([1,0,0,0], metric)), data[:,0])), "Unexpected inner products"
+
+  # Lorentz transformations must preserve causal character
+  batch.lorentzRotate(1,0.321)
+  batch.lorentzBoost(2,0.734)
+  assert (np.array_equal(batch.isTimeLike(), [True,False,False,True])), "Expected time-like vectors"
+  assert (np.array_equal(batch.isLightLike(), [False,True,False,False])), "Expected light-like vector"
+  assert (np.array_equal(batch.isSpaceLike(), [False,False,True,False])), "Expected space-like vector"
+
+  # Composed transformation must agree with sequential transformations
+  trafo = tf.lorentzBoost(3, -0.5) @ tf.lorentzRotation(2, 1.3)
+  transformed = fv.fourvectorBatch(batch.vectors, metric)
+  transformed.lorentzTransform(trafo)
+  for i in range(len(batch)):
+    v = batch[i]
+    v.lorentzRotate(2, 1.3)
+    v.lorentzBoost(3, -0.5)
+    assert (np.allclose(transformed[i].vector, v.vector)), "Unexpected transformed vector"
+
+def test_metricSharing():
+
+  rs = 1.0
+  metric = mt.schwarzschild(rs, 10*rs, 0.5*np.pi)
+  v1 = fv.fourvector([1,0,0,0], metric)
+  v2 = fv.fourvector([0,1,0,0], metric)
+  reference = metric.copy()
+
+  # Modifying the original metric must not affect the four-vectors
+  metric.updateCoords([0,20*rs,0.5*np.pi,0])
+  assert (v1.metric == reference), "Four-vector metric changed with original metric"
+
+  # Results of arithmetic operations must be independent of their operands
+  v3 = v1+v2
+  v3.metric.updateCoords([0,30*rs,0.5*np.pi,0])
+  assert (v1.metric == reference), "Four-vector metric changed with result metric"
+  assert (v2.metric == reference), "Four-vector metric changed with result metric"
+  assert (v3.metric != reference), "Result metric did not change"
+
+  # Evaluating the metric of a four-vector at new coordinates must not affect others
+  v4 = 2*v1
+  v4.updateCoords([0,40*rs,0.5*np.pi,0])
+  assert (v1.metric == reference), "Four-vector metric changed with other four-vector"
+  assert (np.isclose(v4.metric.getMatrix()[0,0], 1-rs/(40*rs))), "Metric was not updated"
+
+  # Batches share metrics in the same way
+  batch = fv.fourvectorBatch([[1,0,0,0],[0,1,0,0]], v1.metric)
+  batch.updateCoords([0,50*rs,0.5*np.pi,0])
+  assert (v1.metric == reference), "Four-vector metric changed with batch"
+  assert (np.isclose(batch.metric.getMatrix()[0,0], 1-rs/(50*rs))), "Batch metric was not updated"
+  batch.metric.updateCoords([0,60*rs,0.5*np.pi,0])
+  assert (np.isclose(batch.metric.getMatrix()[0,0], 1-rs/(60*rs))), "Batch metric was not modified"
+  assert (v1.metric == reference), "Four-vector metric changed with batch"
+
+  # Read-only access keeps the shared snapshot
+  v5 = fv.fourvector([1,0,0,0], reference)
+  shared = v5.getMetric()
+  assert (shared.isFrozen() and (v5+v5).getMetric() is shared), "Expected shared snapshot"
+  assert (v5.metric is not shared and not v5.metric.isFrozen()), "Expected private, writeable copy"
+  # Results share the snapshot again while the private copy is unmodified
+  assert ((v5+v5).getMetric() is shared), "Expected shared snapshot"
+  v5.metric.updateCoords([0,20*rs,0.5*np.pi,0])
+  assert ((v5+v5).getMetric() is not shared and (v5+v5).metric == v5.metric), "Expected snapshot of modified metric"
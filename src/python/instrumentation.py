@@ -0,0 +1,142 @@
+"""
+Opt-in instrumentation of hot paths, e.g. evaluations of the geodesic
+equations, metric updates, copies and comparisons. Instrumented functions
+count their calls and accumulate their run times in module-level counters
+while instrumentation is enabled; when it is disabled, the only overhead
+is a check of the enabled flag.
+
+Usage:
+
+with instrumentation.collect() as stats:
+  path.geodesic(100)
+print(stats)
+"""
+
+import collections
+import contextlib
+import functools
+import time
+
+# Instrumentation is disabled by default
+enabled = False
+
+# Number of calls and accumulated run time in seconds for each instrumented
+# name, times of nested instrumented calls are included in the caller's time
+counters = collections.Counter()
+timers = collections.Counter()
+
+def enable():
+  global enabled
+  enabled = True
+
+def disable():
+  global enabled
+  enabled = False
+
+def reset():
+  """
+  Resets all counters and timers
+  """
+  counters.clear()
+  timers.clear()
+
+def count(name, n = 1):
+  """
+  Adds n to the counter with given name if instrumentation is enabled
+  """
+  if enabled:
+    counters[name] += n
+
+def instrumented(name):
+  """
+  Decorator that counts calls and accumulates the run time of a function
+  under given name while instrumentation is enabled
+  """
+  def decorate(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+      if not enabled:
+        return function(*args, **kwargs)
+      start = time.perf_counter()
+      try:
+        return function(*args, **kwargs)
+      finally:
+        timers[name] += time.perf_counter()-start
+        counters[name] += 1
+    return wrapper
+  return decorate
+
+class stats:
+  """
+  Numbers of calls, accumulated run times and other counts, e.g. numbers of
+  integration steps, as dictionaries indexed by name. Stats objects can be
+  subtracted to obtain the numbers for a section of code.
+  """
+
+  def __init__(self, counters = None, timers = None):
+    self.counters = dict(counters) if counters is not None else {}
+    self.timers = dict(timers) if timers is not None else {}
+
+  def __getitem__(self, name):
+    return self.counters.get(name, 0)
+
+  def __contains__(self, name):
+    return name in self.counters
+
+  def time(self, name):
+    """
+    Returns accumulated run time of given instrumented name in seconds
+    """
+    return self.timers.get(name, 0.0)
+
+  def update(self, other):
+    """
+    Adds counters and timers of another stats object to this one
+    """
+    for name, value in other.counters.items():
+      self.counters[name] = self.counters.get(name, 0) + value
+    for name, value in other.timers.items():
+      self.timers[name] = self.timers.get(name, 0.0) + value
+    return self
+
+  def __sub__(self, other):
+    names = set(self.counters) | set(other.counters)
+    counters = {name: self[name]-other[name] for name in names}
+    names = set(self.timers) | set(other.timers)
+    timers = {name: self.time(name)-other.time(name) for name in names}
+    # Drop names without calls in between
+    return stats({name: value for name, value in counters.items() if value != 0},
+                 {name: value for name, value in timers.items() if counters.get(name, 0) != 0})
+
+  def __repr__(self):
+    lines = []
+    for name in sorted(self.counters):
+      if name in self.timers:
+        lines.append('{:30s} {:10d} {:12.6f} s'.format(name, self.counters[name], self.timers[name]))
+      else:
+        lines.append('{:30s} {:10d}'.format(name, self.counters[name]))
+    return '\n'.join(lines)
+
+def current():
+  """
+  Returns a stats object with the current global counters and timers
+  """
+  return stats(counters, timers)
+
+@contextlib.contextmanager
+def collect():
+  """
+  Context manager that enables instrumentation and yields a stats object,
+  which holds the counts and times for the code in the with block once the
+  block exits. The previous enabled state is restored afterwards.
+  """
+  global enabled
+  previous = enabled
+  result = stats()
+  start = current()
+  enabled = True
+  try:
+    yield result
+  finally:
+    enabled = previous
+    result.update(current()-start)
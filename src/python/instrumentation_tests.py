@@ -0,0 +1,65 @@
+import numpy as np
+import instrumentation as ins
+import metric as mt
+from orbits import circularOrbit
+
+def test_instrumentation():
+
+  # Nothing is counted while instrumentation is disabled
+  assert (not ins.enabled), "Instrumentation should be disabled by default"
+  ins.reset()
+  metric = mt.schwarzschild(1.0, 10.0, 0.5*np.pi)
+  metric.updateCoords([0,5.0,1.0,0])
+  assert (len(ins.counters) == 0 and len(ins.timers) == 0), "Expected no counts"
+
+  # Hot paths are counted and timed inside the context manager
+  with ins.collect() as stats:
+    metric.updateCoords([0,5.0,1.0,0])
+    copy = metric.copy()
+    assert (copy == metric), "Expected equal metrics"
+    ins.count('custom', 3)
+  assert (not ins.enabled), "Instrumentation should be disabled after collection"
+  assert (stats['metric.updateCoords'] == 1 and stats['metric.copy'] == 1 and stats['metric.__eq__'] == 1), "Unexpected counts"
+  assert (stats['custom'] == 3 and stats['unknown'] == 0), "Unexpected counts"
+  assert (stats.time('metric.updateCoords') > 0 and stats.time('custom') == 0), "Unexpected timers"
+
+  # Collections can be nested, outer collection includes inner counts
+  with ins.collect() as outer:
+    with ins.collect() as inner:
+      metric.copy()
+    metric.copy()
+  assert (inner['metric.copy'] == 1 and outer['metric.copy'] == 2), "Unexpected nested counts"
+
+def test_worldlineStats():
+
+  # Eccentric orbit in Schwarzschild spacetime, see test_projection
+  path = circularOrbit(1.0, 10.0, 0.8)
+
+  # Solver statistics are always recorded, hot paths only if enabled
+  for method, nStages in [('RK23', 3), ('RK45', 6), ('DOP853', 12)]:
+    path.geodesic(2000, 100, method = method)
+    steps = path.stats['solver.steps']
+    rejected = path.stats['solver.rejectedSteps']
+    assert (steps == len(path.integralCurve.ts)-1), "Unexpected number of steps"
+    assert (rejected > 0), "Expected rejected steps at default tolerances"
+    # Two RHS evaluations for the initial step size, one per stage for each
+    # attempted step and three for each interpolant of DOP853
+    extra = 3 if method == 'DOP853' else 0
+    assert (path.stats['solver.nfev'] == 2+nStages*(steps+rejected)+extra*steps), "Unexpected number of RHS evaluations"
+    # Steps are also counted without dense output and with projection
+    for options in [{'denseOutput': False}, {'denseOutput': False, 'project': True}]:
+      path.geodesic(2000, 100, method = method, **options)
+      assert (path.stats['solver.steps'] > 0 and 'solver.rejectedSteps' in path.stats), "Expected step counts"
+      if not options.get('project', False):
+        assert (path.stats['solver.steps'] == steps and path.stats['solver.rejectedSteps'] == rejected), "Unexpected step counts"
+    assert ('geodesicRHS' not in path.stats), "Expected no hot-path counters"
+
+  # Implicit solvers report accepted steps
+  path.geodesic(200, 10, method = 'Radau', denseOutput = False)
+  assert (path.stats['solver.steps'] > 0), "Expected accepted steps"
+
+  with ins.collect() as stats:
+    path.geodesic(200, 10)
+  assert (path.stats['geodesicRHS'] == path.stats['solver.nfev']), "Expected one RHS call per evaluation"
+  assert (stats['geodesicRHS'] == path.stats['geodesicRHS']), "Expected counts in collection"
+  assert (stats['solver.steps'] == path.stats['solver.steps']), "Expected solver statistics in collection"
@@ -1,4 +1,14 @@
 import numpy as np
+import math
+import bisect
+import collections
+import instrumentation as ins
+
+# SymPy is only needed for symbolic metrics
+try:
+  import sympy
+except ImportError:
+  sympy = None
 
 # Use "new-style" classes for easier inheritance
 __metaclass__ = type
@@ -12,15 +22,28 @@ class metric:
     self.name = "Null"
     self.matrix = np.zeros((4,4), dtype = np.float64)
     self.christoffel = np.zeros((4,4,4), dtype = np.float64)
+    # Optional hashable tuple that uniquely determines matrix elements and
+    # Christoffel symbols, e.g. metric parameters and the coordinates passed
+    # to updateCoords; subclasses must keep it up to date or leave it at None
+    self.fingerprint = None
+    # Optional sparsity pattern of the Christoffel symbols, see
+    # setChristoffelPattern; all symbols are assumed non-zero if None
+    self.christoffelPattern = None
 
+  @ins.instrumented('metric.__eq__')
   def __eq__(self, other):
     """
     Requires that operand is a metric with same name and
 	numerically near-identical matrix elements and Christoffel
-	symbols
+	symbols. Identical objects and metrics with identical fingerprints
+	are equal without comparing any matrix elements.
     """
+    if self is other:
+      return True
     result = isinstance(other, metric)
     result = result and (self.name == other.name)
+    if result and self.fingerprint is not None and self.fingerprint == other.fingerprint:
+      return True
     result = result and np.allclose(self.matrix, other.matrix)
     result = result and np.allclose(self.christoffel, other.christoffel)
     return result
@@ -40,9 +63,181 @@ class metric:
   def getChristoffel(self):
     return self.christoffel
 
+  def getFingerprint(self):
+    return self.fingerprint
+
+  def getCacheKey(self):
+    """
+    Returns a tuple of name and parameters that define this metric as a
+    function of coordinates, which is stable across processes and can be
+    used as key for persistent caches of results, see cache, or None if the
+    metric cannot be identified in this way
+    """
+    return None
+
+  @ins.instrumented('metric.updateCoords')
   def updateCoords(self, coord):
     pass
 
+  @ins.instrumented('metric.copy')
+  def copy(self):
+    """
+    Returns an independent, writeable copy of this metric. This is much
+    cheaper than a deep copy, as only the matrix and Christoffel arrays
+    are duplicated.
+    """
+    # Bypass copy protocol, which may be customised for pickling
+    result = self.__class__.__new__(self.__class__)
+    result.__dict__.update(self.__dict__)
+    result.matrix = self.matrix.copy()
+    result.christoffel = self.christoffel.copy()
+    # Snapshot this copy was made from, see snapshot
+    result._origin = self if self.isFrozen() else getattr(self, '_origin', None)
+    return result
+
+  def freeze(self):
+    """
+    Makes this metric read-only in place, so that it can be shared safely
+    between four-vectors. Any attempt to modify a frozen metric, e.g. using
+    updateCoords, raises an error. Returns the metric itself.
+    """
+    self.matrix.flags.writeable = False
+    self.christoffel.flags.writeable = False
+    # Frozen metrics are their own snapshots
+    self._origin = None
+    return self
+
+  def isFrozen(self):
+    return not self.matrix.flags.writeable
+
+  def snapshot(self):
+    """
+    Returns a read-only snapshot of this metric. Frozen metrics are
+    immutable and are therefore returned without copying, as are the
+    snapshots that unmodified copies were made from, i.e. copies with the
+    same fingerprint.
+    """
+    if self.isFrozen():
+      return self
+    origin = getattr(self, '_origin', None)
+    if origin is not None and self.fingerprint is not None and origin.fingerprint == self.fingerprint:
+      return origin
+    return self.copy().freeze()
+
+  def evaluateBatch(self, coords):
+    """
+    Returns matrix elements and Christoffel symbols at N coordinate tuples,
+    given as (N,4) array, in arrays of shape (N,4,4) and (N,4,4,4). The
+    metric itself is not modified.
+
+    This generic version calls updateCoords on a copy of the metric for each
+    coordinate tuple, subclasses should provide a vectorised version.
+    """
+    coords = np.asarray(coords, dtype = np.float64)
+    assert (coords.ndim == 2 and coords.shape[1] == 4), "Coordinate array must have shape (N,4)"
+
+    work = self.copy()
+    matrices = np.empty((coords.shape[0],4,4), dtype = np.float64)
+    christoffels = np.empty((coords.shape[0],4,4,4), dtype = np.float64)
+    for i in range(coords.shape[0]):
+      work.updateCoords(coords[i])
+      matrices[i] = work.getMatrix()
+      christoffels[i] = work.getChristoffel()
+    return matrices, christoffels
+
+  def setChristoffelPattern(self, indices):
+    """
+    Declares which Christoffel symbols gamma^i_jk can be non-zero, given as
+    a list of index tuples (i,j,k) with j <= k. The symbols are symmetric in
+    the lower indices, so that entries with j > k are implied. Contractions
+    with velocities then only touch the declared entries.
+    """
+    indices = np.array(indices, dtype = np.intp).reshape(-1,3)
+    assert (np.all(indices >= 0) and np.all(indices < 4)), "Indices must be in range 0..3"
+    assert (np.all(indices[:,1] <= indices[:,2])), "Lower indices must be ordered, j <= k"
+
+    # Store flat tensor indices, lower indices and a scatter matrix that sums
+    # the terms for each upper index i, counting the symmetric entries twice
+    flat = np.ravel_multi_index((indices[:,0], indices[:,1], indices[:,2]), (4,4,4))
+    scatter = np.zeros((4, indices.shape[0]), dtype = np.float64)
+    scatter[indices[:,0], np.arange(indices.shape[0])] = np.where(indices[:,1] == indices[:,2], 1, 2)
+    self.christoffelPattern = (flat, indices[:,1].copy(), indices[:,2].copy(), scatter)
+
+  def getChristoffelPattern(self):
+    return self.christoffelPattern
+
+  def contractChristoffel(self, v):
+    """
+    Returns contraction of the Christoffel symbols with a contravariant
+    vector,
+
+    gamma^i_jk * v^j * v^k
+
+    using the sparsity pattern of the symbols if it is known.
+    """
+    if self.christoffelPattern is None:
+      return np.einsum('ijk,j,k', self.christoffel, v, v)
+    flat, j, k, scatter = self.christoffelPattern
+    return np.dot(scatter, self.christoffel.take(flat)*(v.take(j)*v.take(k)))
+
+  def contractChristoffelBatch(self, christoffels, vectors):
+    """
+    Returns contractions of N sets of Christoffel symbols, e.g. from
+    evaluateBatch, with N contravariant vectors as (N,4) array, see
+    contractChristoffel
+    """
+    if self.christoffelPattern is None:
+      return np.einsum('nijk,nj,nk->ni', christoffels, vectors, vectors)
+    flat, j, k, scatter = self.christoffelPattern
+    values = christoffels.reshape(-1,64)[:,flat]
+    return np.dot(values*vectors[:,j]*vectors[:,k], scatter.T)
+
+  def geodesicAcceleration(self, coord, v, out):
+    """
+    Writes the geodesic acceleration at given coordinates for velocity v,
+
+    a^i = -gamma^i_jk * v^j * v^k
+
+    into the preallocated array out with 4 elements and returns it. This
+    generic version evaluates the metric using updateCoords, subclasses can
+    provide fused versions that neither modify the metric nor allocate
+    temporary arrays.
+    """
+    self.updateCoords(coord)
+    np.negative(self.contractChristoffel(v), out = out)
+    return out
+
+  def geodesicAccelerationBatch(self, coords, vectors):
+    """
+    Returns geodesic accelerations for N coordinate tuples and velocities,
+    given as (N,4) arrays, see geodesicAcceleration. This generic version
+    uses evaluateBatch and the sparse contraction of the Christoffel symbols.
+    """
+    matrices, christoffels = self.evaluateBatch(coords)
+    return -self.contractChristoffelBatch(christoffels, vectors)
+
+  def conservedQuantities(self, coords, vectors):
+    """
+    Returns a dictionary of quantities that are conserved along geodesics,
+    e.g. energy and angular momentum from Killing vectors of the metric, as
+    arrays with one value for each of N coordinate tuples and velocities,
+    given as (N,4) arrays. The generic version returns an empty dictionary.
+    """
+    return {}
+
+  def geodesicJacobian(self, coord, v):
+    """
+    Returns the Jacobian of the geodesic equations as first-order system in
+    coordinates x and velocity v, see worldline.geodesicRHS,
+
+    d(x', v')/d(x, v) = [[0, 1], [da/dx, da/dv]]
+
+    as (8,8) array, where a is the geodesic acceleration, or None if the
+    metric has no analytic Jacobian. Implicit solvers then approximate it
+    with finite differences.
+    """
+    return None
+
   def scalarProduct(self, v, w):
     """
     Returns scalar product of two contravariant vectors,
@@ -51,6 +246,15 @@ class metric:
     """
     return np.einsum('i,ij,j', v, self.matrix, w)
 
+  def scalarProducts(self, v, w):
+    """
+    Returns scalar products of two stacks of contravariant vectors with
+    shape (N,4), computed row by row,
+
+    v_n^i * g_ij * w_n^j
+    """
+    return np.sum(np.matmul(v, self.matrix)*w, axis = -1)
+
 # -----------------------------------------------------------------------
 
 class minkowski(metric):
@@ -65,6 +269,46 @@ class minkowski(metric):
     super(minkowski, self).__init__()
     self.name = 'Minkowski'
     self.matrix = np.diagflat(np.array([1,-1,-1,-1], dtype = np.float64))
+    # Minkowski metric is constant
+    self.fingerprint = (self.name,)
+    self.setChristoffelPattern([])
+
+  def getCacheKey(self):
+    return (self.name,)
+
+  def geodesicAcceleration(self, coord, v, out):
+    """
+    Geodesics are straight lines, see metric.geodesicAcceleration
+    """
+    out[:] = 0
+    return out
+
+  def geodesicAccelerationBatch(self, coords, vectors):
+    return np.zeros_like(vectors, dtype = np.float64)
+
+  def geodesicJacobian(self, coord, v):
+    jacobian = np.zeros((8,8), dtype = np.float64)
+    jacobian[0:4,4:8] = np.eye(4)
+    return jacobian
+
+  def conservedQuantities(self, coords, vectors):
+    """
+    Energy v^0 and linear momentum v^1..v^3 from translation invariance
+    """
+    vectors = np.asarray(vectors, dtype = np.float64)
+    return {'energy': vectors[:,0].copy(), 'momentum': vectors[:,1:4].copy()}
+
+  def evaluateBatch(self, coords):
+    """
+    Returns matrix elements and Christoffel symbols at N coordinate tuples,
+    given as (N,4) array, in arrays of shape (N,4,4) and (N,4,4,4)
+    """
+    coords = np.asarray(coords, dtype = np.float64)
+    assert (coords.ndim == 2 and coords.shape[1] == 4), "Coordinate array must have shape (N,4)"
+
+    matrices = np.broadcast_to(self.matrix, (coords.shape[0],4,4)).copy()
+    christoffels = np.zeros((coords.shape[0],4,4,4), dtype = np.float64)
+    return matrices, christoffels
 
 # -----------------------------------------------------------------------
 
@@ -88,8 +332,11 @@ class schwarzschild(metric):
     self.rSchwarzschild = rSchwarzschild
     self.r = r
     self.theta = theta
+    self.setChristoffelPattern([(0,0,1), (1,0,0), (1,1,1), (1,2,2), (1,3,3),
+                                (2,1,2), (2,3,3), (3,1,3), (3,2,3)])
     self.updateCoords([0, r, theta, 0])
 
+  @ins.instrumented('metric.updateCoords')
   def updateCoords(self, coord):
     if isinstance(coord, np.ndarray):
       assert (coord.shape == (4,)), "Coordinate tuple must have 4 components"
@@ -121,3 +368,605 @@ class schwarzschild(metric):
     self.christoffel[3,1,3] = self.christoffel[3,3,1] = 1/r
     if not np.isclose(np.tan(theta),0):
       self.christoffel[3,2,3] = self.christoffel[3,3,2] = 1/np.tan(theta)
+    else:
+      # Do not keep values from previous coordinates, the fingerprint below
+      # must determine all Christoffel symbols
+      self.christoffel[3,2,3] = self.christoffel[3,3,2] = 0
+
+    # Metric only depends on radius and polar angle
+    self.fingerprint = (self.name, self.rSchwarzschild, float(r), float(theta))
+
+  def geodesicAcceleration(self, coord, v, out):
+    """
+    Closed-form geodesic acceleration using the non-zero Christoffel symbols
+    from updateCoords, evaluated with scalar arithmetic without modifying the
+    metric, see metric.geodesicAcceleration
+    """
+    r = float(coord[1])
+    theta = float(coord[2])
+    v0, v1, v2, v3 = v.tolist()
+    rs = self.rSchwarzschild
+    sinTheta = math.sin(theta)
+    cosTheta = math.cos(theta)
+    # Same treatment of the polar axis as in updateCoords
+    tanTheta = math.tan(theta)
+    cotTheta = 1/tanTheta if abs(tanTheta) > 1.0e-8 else 0.0
+
+    gamma001 = 0.5*rs/(r*(r-rs))
+    out[0] = -2*gamma001*v0*v1
+    out[1] = -0.5*rs*(r-rs)/(r*r*r)*v0*v0 + gamma001*v1*v1 + (r-rs)*(v2*v2 + sinTheta*sinTheta*v3*v3)
+    out[2] = -2/r*v1*v2 + sinTheta*cosTheta*v3*v3
+    out[3] = -2/r*v1*v3 - 2*cotTheta*v2*v3
+    return out
+
+  def geodesicAccelerationBatch(self, coords, vectors):
+    """
+    Vectorised version of geodesicAcceleration for N coordinate tuples and
+    velocities, given as (N,4) arrays
+    """
+    r = coords[:,1]
+    theta = coords[:,2]
+    v0, v1, v2, v3 = vectors[:,0], vectors[:,1], vectors[:,2], vectors[:,3]
+    rs = self.rSchwarzschild
+    sinTheta = np.sin(theta)
+    cosTheta = np.cos(theta)
+    tanTheta = np.tan(theta)
+    cotTheta = np.divide(1, tanTheta, out = np.zeros_like(tanTheta), where = np.abs(tanTheta) > 1.0e-8)
+
+    gamma001 = 0.5*rs/(r*(r-rs))
+    result = np.empty((coords.shape[0],4), dtype = np.float64)
+    result[:,0] = -2*gamma001*v0*v1
+    result[:,1] = -0.5*rs*(r-rs)/(r*r*r)*v0*v0 + gamma001*v1*v1 + (r-rs)*(v2*v2 + sinTheta*sinTheta*v3*v3)
+    result[:,2] = -2/r*v1*v2 + sinTheta*cosTheta*v3*v3
+    result[:,3] = -2/r*v1*v3 - 2*cotTheta*v2*v3
+    return result
+
+  def getCacheKey(self):
+    return (self.name, float(self.rSchwarzschild))
+
+  def conservedQuantities(self, coords, vectors):
+    """
+    Killing energy and angular momentum per unit mass (or per unit of
+    affine parameter for photons),
+
+    E = (1-rs/r) * v^0
+    L = r^2 * sin(theta)^2 * v^3
+    """
+    coords = np.asarray(coords, dtype = np.float64)
+    vectors = np.asarray(vectors, dtype = np.float64)
+    r = coords[:,1]
+    sinTheta = np.sin(coords[:,2])
+    rs = self.rSchwarzschild
+    return {'energy': (1-rs/r)*vectors[:,0], 'angularMomentum': r*r*sinTheta*sinTheta*vectors[:,3]}
+
+  def geodesicJacobian(self, coord, v):
+    """
+    Analytic Jacobian of the closed-form geodesic acceleration, see
+    metric.geodesicJacobian
+    """
+    r = float(coord[1])
+    theta = float(coord[2])
+    v0, v1, v2, v3 = [float(x) for x in v]
+    rs = self.rSchwarzschild
+    sinTheta = math.sin(theta)
+    cosTheta = math.cos(theta)
+    # Same treatment of the polar axis as in updateCoords
+    tanTheta = math.tan(theta)
+    if abs(tanTheta) > 1.0e-8:
+      cotTheta = 1/tanTheta
+      dcotTheta = -1/(sinTheta*sinTheta)
+    else:
+      cotTheta = 0.0
+      dcotTheta = 0.0
+
+    gamma001 = 0.5*rs/(r*(r-rs))
+    dgamma001 = -0.5*rs*(2*r-rs)/(r*r*(r-rs)*(r-rs))
+    gamma100 = 0.5*rs*(r-rs)/(r*r*r)
+    dgamma100 = 0.5*rs*(3*rs-2*r)/(r*r*r*r)
+
+    jacobian = np.zeros((8,8), dtype = np.float64)
+    jacobian[0:4,4:8] = np.eye(4)
+    # Derivatives with respect to r and theta
+    jacobian[4,1] = -2*dgamma001*v0*v1
+    jacobian[5,1] = -dgamma100*v0*v0 + dgamma001*v1*v1 + v2*v2 + sinTheta*sinTheta*v3*v3
+    jacobian[5,2] = 2*(r-rs)*sinTheta*cosTheta*v3*v3
+    jacobian[6,1] = 2/(r*r)*v1*v2
+    jacobian[6,2] = (cosTheta*cosTheta-sinTheta*sinTheta)*v3*v3
+    jacobian[7,1] = 2/(r*r)*v1*v3
+    jacobian[7,2] = -2*dcotTheta*v2*v3
+    # Derivatives with respect to velocities
+    jacobian[4,4] = -2*gamma001*v1
+    jacobian[4,5] = -2*gamma001*v0
+    jacobian[5,4] = -2*gamma100*v0
+    jacobian[5,5] = 2*gamma001*v1
+    jacobian[5,6] = 2*(r-rs)*v2
+    jacobian[5,7] = 2*(r-rs)*sinTheta*sinTheta*v3
+    jacobian[6,5] = -2/r*v2
+    jacobian[6,6] = -2/r*v1
+    jacobian[6,7] = 2*sinTheta*cosTheta*v3
+    jacobian[7,5] = -2/r*v3
+    jacobian[7,6] = -2*cotTheta*v3
+    jacobian[7,7] = -2/r*v1 - 2*cotTheta*v2
+    return jacobian
+
+  def evaluateBatch(self, coords):
+    """
+    Returns matrix elements and Christoffel symbols at N coordinate tuples,
+    given as (N,4) array, in arrays of shape (N,4,4) and (N,4,4,4). All
+    components are computed in one vectorised pass, see updateCoords.
+    """
+    coords = np.asarray(coords, dtype = np.float64)
+    assert (coords.ndim == 2 and coords.shape[1] == 4), "Coordinate array must have shape (N,4)"
+
+    r = coords[:,1]
+    theta = coords[:,2]
+    sinTheta = np.sin(theta)
+    cosTheta = np.cos(theta)
+    tanTheta = np.tan(theta)
+
+    matrices = np.zeros((coords.shape[0],4,4), dtype = np.float64)
+    matrices[:,0,0] = 1-self.rSchwarzschild/r
+    matrices[:,1,1] = -1/matrices[:,0,0]
+    matrices[:,2,2] = -r*r
+    matrices[:,3,3] = -r*r*sinTheta*sinTheta
+
+    christoffels = np.zeros((coords.shape[0],4,4,4), dtype = np.float64)
+
+    # Time components
+    christoffels[:,0,0,1] = christoffels[:,0,1,0] = 0.5*self.rSchwarzschild/(r*(r-self.rSchwarzschild))
+
+    # Radius components
+    christoffels[:,1,0,0] = 0.5*self.rSchwarzschild*(r-self.rSchwarzschild)/(r*r*r)
+    christoffels[:,1,1,1] = -christoffels[:,0,0,1]
+    christoffels[:,1,2,2] = -(r-self.rSchwarzschild)
+    christoffels[:,1,3,3] = christoffels[:,1,2,2]*sinTheta*sinTheta
+
+    # Azimuth components
+    christoffels[:,2,1,2] = christoffels[:,2,2,1] = 1/r
+    christoffels[:,2,3,3] = -sinTheta*cosTheta
+
+    # Polar components, cot(theta) is set to zero on the polar axis
+    christoffels[:,3,1,3] = christoffels[:,3,3,1] = 1/r
+    regular = np.logical_not(np.isclose(tanTheta,0))
+    christoffels[regular,3,2,3] = christoffels[regular,3,3,2] = 1/tanTheta[regular]
+
+    return matrices, christoffels
+
+# -----------------------------------------------------------------------
+
+class tabulatedMetric(metric):
+  """
+  Wraps another metric, e.g. one that is expensive to evaluate, and answers
+  updateCoords by multilinear interpolation of matrix elements and
+  Christoffel symbols that are tabulated once on a grid of coordinates. The
+  grid only spans the coordinates that the wrapped metric depends on, e.g.
+  radius and polar angle for Schwarzschild.
+  """
+
+  def __init__(self, base, grid, coord = None):
+    """
+    Tabulate metric base on a grid given as dictionary that maps coordinate
+    indices 0..3 to ascending arrays of at least 2 nodes, e.g.
+
+    {1: np.linspace(rMin, rMax, nr), 2: np.linspace(thetaMin, thetaMax, ntheta)}
+
+    Coordinates that are not in the grid are set to zero for tabulation.
+    The metric is initially evaluated at coord, or at the first grid node.
+    """
+    assert (isinstance(base, metric)), "Argument must be metric type"
+    assert (len(grid) > 0), "Grid must span at least one coordinate"
+
+    super(tabulatedMetric, self).__init__()
+    self.name = base.getName()
+    self.base = base
+    self.christoffelPattern = base.getChristoffelPattern()
+
+    self.axes = sorted(grid.keys())
+    self.nodes = []
+    for axis in self.axes:
+      assert (axis >= 0 and axis < 4), "Coordinate indices must be in range 0..3"
+      nodes = np.array(grid[axis], dtype = np.float64)
+      assert (nodes.ndim == 1 and nodes.shape[0] >= 2), "Grid needs at least 2 nodes per coordinate"
+      assert (np.all(np.diff(nodes) > 0)), "Grid nodes must be ascending"
+      self.nodes.append(nodes)
+    # Plain lists for fast scalar lookups in updateCoords
+    self.nodeLists = [nodes.tolist() for nodes in self.nodes]
+
+    # Evaluate wrapped metric on all grid nodes in one batch and store matrix
+    # elements and Christoffel symbols together in one table
+    mesh = np.meshgrid(*self.nodes, indexing = 'ij')
+    coords = np.zeros((mesh[0].size, 4), dtype = np.float64)
+    for axis, values in zip(self.axes, mesh):
+      coords[:,axis] = values.ravel()
+    matrices, christoffels = base.evaluateBatch(coords)
+    shape = mesh[0].shape
+    self.table = np.concatenate((matrices.reshape(shape + (16,)), christoffels.reshape(shape + (64,))), axis = -1)
+    self.table.flags.writeable = False
+
+    # Corners of a grid cell as offsets of the lower node indices
+    self.corners = np.array(np.meshgrid(*[[0,1]]*len(self.axes), indexing = 'ij')).reshape(len(self.axes), -1).T
+
+    self.matrixErrorBound, self.christoffelErrorBound = self.estimateErrorBounds()
+
+    if coord is None:
+      coord = np.zeros(4, dtype = np.float64)
+      coord[self.axes] = [nodes[0] for nodes in self.nodes]
+    self.updateCoords(coord)
+
+  def estimateErrorBounds(self):
+    """
+    Returns estimates of the maximum absolute interpolation errors of matrix
+    elements and Christoffel symbols. Along each grid coordinate, the error of
+    linear interpolation is bounded by
+
+    |f - f_interpolated| <= h^2/8 * max |f''|
+
+    for cell size h. Second derivatives are estimated from second divided
+    differences of the tabulated values, and the bounds of all coordinates
+    are added. A safety factor of 2 accounts for variations of f'' within
+    a cell, the estimate is infinite if any coordinate has only 2 nodes.
+    """
+    bound = np.zeros(80, dtype = np.float64)
+    for dim, nodes in enumerate(self.nodes):
+      if nodes.shape[0] < 3:
+        return np.inf, np.inf
+      values = np.moveaxis(self.table, dim, 0)
+      h = np.diff(nodes)
+      shape = (-1,) + (1,)*(values.ndim-1)
+      slopes = np.diff(values, axis = 0)/h.reshape(shape)
+      curvatures = 2*np.diff(slopes, axis = 0)/(nodes[2:]-nodes[:-2]).reshape(shape)
+      # Use larger adjacent cell for each interior node
+      cellSizes = np.maximum(h[:-1], h[1:]).reshape(shape)
+      errors = np.abs(curvatures)*cellSizes*cellSizes/8
+      bound += np.max(errors.reshape(-1,80), axis = 0)
+    bound *= 2
+    return np.max(bound[0:16]), np.max(bound[16:80])
+
+  def interpolate(self, coords):
+    """
+    Returns interpolated matrix elements and Christoffel symbols at N
+    coordinate tuples, given as (N,4) array, as flat array of shape (N,80)
+    """
+    lower = []
+    fractions = []
+    for axis, nodes in zip(self.axes, self.nodes):
+      x = coords[:,axis]
+      assert (np.all(x >= nodes[0]) and np.all(x <= nodes[-1])), "Coordinates outside of tabulated range"
+      i = np.clip(np.searchsorted(nodes, x, side = 'right')-1, 0, nodes.shape[0]-2)
+      lower.append(i)
+      fractions.append((x-nodes[i])/(nodes[i+1]-nodes[i]))
+
+    # Add weighted table values at all corners of the grid cells
+    values = np.zeros((coords.shape[0], 80), dtype = np.float64)
+    for corner in self.corners:
+      weights = np.ones(coords.shape[0], dtype = np.float64)
+      index = []
+      for dim in range(len(self.axes)):
+        weights *= fractions[dim] if corner[dim] else 1-fractions[dim]
+        index.append(lower[dim]+corner[dim])
+      values += weights[:,np.newaxis]*self.table[tuple(index)]
+    return values
+
+  @ins.instrumented('metric.updateCoords')
+  def updateCoords(self, coord):
+    if isinstance(coord, np.ndarray):
+      assert (coord.shape == (4,)), "Coordinate tuple must have 4 components"
+    else:
+      assert (len(coord) == 4), "Coordinate tuple must have 4 components"
+
+    # Scalar version of interpolate, locate grid cell and reduce its corner
+    # values one coordinate at a time
+    cell = []
+    fractions = []
+    for axis, nodes in zip(self.axes, self.nodeLists):
+      x = float(coord[axis])
+      assert (x >= nodes[0] and x <= nodes[-1]), "Coordinates outside of tabulated range"
+      i = min(max(bisect.bisect_right(nodes, x)-1, 0), len(nodes)-2)
+      cell.append(slice(i, i+2))
+      fractions.append((x-nodes[i])/(nodes[i+1]-nodes[i]))
+    values = self.table[tuple(cell)]
+    for fraction in fractions:
+      values = (1-fraction)*values[0] + fraction*values[1]
+
+    self.matrix[:] = values[0:16].reshape(4,4)
+    self.christoffel[:] = values[16:80].reshape(4,4,4)
+
+    # Metric only depends on tabulated coordinates
+    self.fingerprint = (self.name, id(self.table)) + tuple(float(coord[axis]) for axis in self.axes)
+
+  def evaluateBatch(self, coords):
+    """
+    Returns interpolated matrix elements and Christoffel symbols at N
+    coordinate tuples, given as (N,4) array, in arrays of shape (N,4,4) and
+    (N,4,4,4)
+    """
+    coords = np.asarray(coords, dtype = np.float64)
+    assert (coords.ndim == 2 and coords.shape[1] == 4), "Coordinate array must have shape (N,4)"
+
+    values = self.interpolate(coords)
+    return values[:,0:16].reshape(-1,4,4), values[:,16:80].reshape(-1,4,4,4)
+
+# -----------------------------------------------------------------------
+
+class symbolicMetric(metric):
+  """
+  Defines a metric from matrix elements g_ij(x) given as SymPy expressions.
+  The Christoffel symbols,
+
+  gamma^i_jk = 1/2 * g^il * (d_j g_lk + d_k g_lj - d_l g_jk)
+
+  their sparsity pattern and the geodesic acceleration are derived
+  symbolically once, and compiled into functions for scalar and vectorised
+  NumPy evaluation. Requires SymPy.
+  """
+
+  def __init__(self, name, coords, matrix, coord, parameters = None, simplify = True):
+    """
+    Define metric with given name in coordinates given as 4 SymPy symbols,
+    where matrix is a symmetric 4x4 SymPy matrix (or nested list) of
+    expressions in these coordinates. Symbolic parameters in the expressions,
+    e.g. a mass, are replaced by the values in dictionary parameters. The
+    metric is initially evaluated at coordinate tuple coord. Simplification
+    of the derived expressions can be switched off for complicated metrics.
+    """
+    assert (sympy is not None), "Symbolic metrics require SymPy"
+    assert (len(coords) == 4), "Need 4 coordinate symbols"
+
+    super(symbolicMetric, self).__init__()
+    self.name = name
+    self.coordSymbols = tuple(coords)
+    self.velocitySymbols = sympy.symbols('v0:4')
+
+    parameters = {} if parameters is None else parameters
+    self.parameters = tuple(sorted((str(key), float(value)) for key, value in parameters.items()))
+    g = sympy.Matrix(matrix).subs(parameters)
+    assert (g.shape == (4,4)), "Matrix must have 4x4 elements"
+    assert (sympy.simplify(g-g.T) == sympy.zeros(4,4)), "Matrix must be symmetric"
+    assert (g.free_symbols <= set(self.coordSymbols)), "Matrix depends on parameters without value"
+    simplified = sympy.simplify if simplify else (lambda expr: expr)
+
+    # Matrix elements and coordinates that the metric depends on
+    self.matrixExpressions = {}
+    for i in range(4):
+      for j in range(4):
+        if g[i,j] != 0:
+          self.matrixExpressions[(i,j)] = g[i,j]
+    self.dependencies = tuple(l for l in range(4) if self.coordSymbols[l] in g.free_symbols)
+    # Exact representation of the matrix elements, which together with the
+    # name uniquely identifies the metric as a function of coordinates
+    self.expressionKey = tuple((key, sympy.srepr(expr)) for key, expr in sorted(self.matrixExpressions.items()))
+
+    # Non-zero Christoffel symbols with j <= k
+    ginv = simplified(g.inv())
+    derivatives = [g.diff(x) for x in self.coordSymbols]
+    self.christoffelExpressions = {}
+    for i in range(4):
+      for j in range(4):
+        for k in range(j,4):
+          expr = simplified(sum(ginv[i,l]*(derivatives[j][l,k] + derivatives[k][l,j] - derivatives[l][j,k])
+                                for l in range(4))/2)
+          if expr != 0:
+            self.christoffelExpressions[(i,j,k)] = expr
+    self.setChristoffelPattern(sorted(self.christoffelExpressions.keys()))
+
+    # Geodesic acceleration as function of coordinates and velocities
+    v = self.velocitySymbols
+    self.accelerationExpressions = [0]*4
+    for (i,j,k), expr in self.christoffelExpressions.items():
+      weight = 1 if j == k else 2
+      self.accelerationExpressions[i] -= weight*expr*v[j]*v[k]
+    self.jacobianExpressions = sympy.Matrix(self.accelerationExpressions).jacobian(self.coordSymbols + v).tolist()
+
+    self.compile()
+    self.updateCoords(coord)
+
+  def compile(self):
+    """
+    Generates scalar and vectorised evaluation functions for matrix elements,
+    Christoffel symbols and geodesic acceleration using common subexpression
+    elimination
+    """
+    expressions = list(self.matrixExpressions.values()) + list(self.christoffelExpressions.values())
+    self.evaluateScalar = sympy.lambdify(self.coordSymbols, expressions, modules = 'math', cse = True)
+    self.evaluateArray = sympy.lambdify(self.coordSymbols, expressions, modules = 'numpy', cse = True)
+    symbols = self.coordSymbols + self.velocitySymbols
+    self.accelerationScalar = sympy.lambdify(symbols, self.accelerationExpressions, modules = 'math', cse = True)
+    self.accelerationArray = sympy.lambdify(symbols, self.accelerationExpressions, modules = 'numpy', cse = True)
+    self.jacobianScalar = sympy.lambdify(symbols, self.jacobianExpressions, modules = 'math', cse = True)
+
+    # Flat array indices of matrix elements and of both symmetric entries of
+    # each Christoffel symbol
+    self.matrixFlat = np.array([4*i+j for (i,j) in self.matrixExpressions], dtype = np.intp)
+    self.christoffelFlat = np.array([16*i+4*j+k for (i,j,k) in self.christoffelExpressions], dtype = np.intp)
+    self.christoffelFlatSymmetric = np.array([16*i+4*k+j for (i,j,k) in self.christoffelExpressions], dtype = np.intp)
+
+  def getCacheKey(self):
+    # Exact matrix expressions after substitution of parameters define the
+    # metric, parameters are included with their exact values
+    return (self.name, tuple(str(x) for x in self.coordSymbols), self.parameters, self.expressionKey)
+
+  def __getstate__(self):
+    # Generated functions cannot be pickled, they are compiled again when
+    # unpickling, e.g. in worker processes
+    state = self.__dict__.copy()
+    for key in ['evaluateScalar', 'evaluateArray', 'accelerationScalar', 'accelerationArray', 'jacobianScalar']:
+      del state[key]
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self.compile()
+
+  @ins.instrumented('metric.updateCoords')
+  def updateCoords(self, coord):
+    if isinstance(coord, np.ndarray):
+      assert (coord.shape == (4,)), "Coordinate tuple must have 4 components"
+    else:
+      assert (len(coord) == 4), "Coordinate tuple must have 4 components"
+
+    values = self.evaluateScalar(*[float(x) for x in coord])
+    nMatrix = self.matrixFlat.shape[0]
+    self.matrix.put(self.matrixFlat, values[:nMatrix])
+    self.christoffel.put(self.christoffelFlat, values[nMatrix:])
+    self.christoffel.put(self.christoffelFlatSymmetric, values[nMatrix:])
+
+    # Metric only depends on its matrix elements and coordinates that appear in them
+    self.fingerprint = (self.name, self.expressionKey) + tuple(float(coord[l]) for l in self.dependencies)
+
+  def evaluateBatch(self, coords):
+    """
+    Returns matrix elements and Christoffel symbols at N coordinate tuples,
+    given as (N,4) array, in arrays of shape (N,4,4) and (N,4,4,4) using the
+    vectorised generated function
+    """
+    coords = np.asarray(coords, dtype = np.float64)
+    assert (coords.ndim == 2 and coords.shape[1] == 4), "Coordinate array must have shape (N,4)"
+
+    values = self.evaluateArray(*coords.T)
+    nMatrix = self.matrixFlat.shape[0]
+    matrices = np.zeros((coords.shape[0],16), dtype = np.float64)
+    christoffels = np.zeros((coords.shape[0],64), dtype = np.float64)
+    # Constant expressions evaluate to scalars and are broadcast
+    for n in range(nMatrix):
+      matrices[:,self.matrixFlat[n]] = values[n]
+    for n in range(self.christoffelFlat.shape[0]):
+      christoffels[:,self.christoffelFlat[n]] = christoffels[:,self.christoffelFlatSymmetric[n]] = values[nMatrix+n]
+    return matrices.reshape(-1,4,4), christoffels.reshape(-1,4,4,4)
+
+  def geodesicAcceleration(self, coord, v, out):
+    """
+    Generated closed-form geodesic acceleration, see
+    metric.geodesicAcceleration
+    """
+    out[:] = self.accelerationScalar(*[float(x) for x in coord], *v.tolist())
+    return out
+
+  def geodesicAccelerationBatch(self, coords, vectors):
+    """
+    Generated vectorised geodesic acceleration, see
+    metric.geodesicAccelerationBatch
+    """
+    values = self.accelerationArray(*coords.T, *vectors.T)
+    result = np.empty((coords.shape[0],4), dtype = np.float64)
+    for i in range(4):
+      result[:,i] = values[i]
+    return result
+
+  def geodesicJacobian(self, coord, v):
+    """
+    Generated Jacobian of the geodesic acceleration, see
+    metric.geodesicJacobian
+    """
+    jacobian = np.zeros((8,8), dtype = np.float64)
+    jacobian[0:4,4:8] = np.eye(4)
+    jacobian[4:8,:] = self.jacobianScalar(*[float(x) for x in coord], *[float(x) for x in v])
+    return jacobian
+
+# -----------------------------------------------------------------------
+
+class numericalMetric(metric):
+  """
+  Defines a metric from a numerical function for its matrix elements g_ij(x),
+  e.g. the output of a solver, where no analytic Christoffel symbols are
+  available. The Christoffel symbols,
+
+  gamma^i_jk = 1/2 * g^il * (d_j g_lk + d_k g_lj - d_l g_jk)
+
+  are computed from finite-difference derivatives of the matrix elements in
+  all directions, using one batched call of the matrix function and a batched
+  matrix inverse. Results for the most recent coordinate tuples are cached.
+  """
+
+  def __init__(self, name, matrixFunction, coord, step = 1.0e-5, method = 'central',
+               dependencies = (0,1,2,3), cacheSize = 16):
+    """
+    Define metric with given name, where matrixFunction maps an (N,4) array
+    of coordinate tuples to an (N,4,4) array of matrix elements. Derivatives
+    are taken with given step, relative to the coordinate value for
+    coordinates with magnitude > 1, either using second-order central
+    differences (method 'central') or the complex-step method (method
+    'complex'), which requires a matrix function that accepts complex
+    coordinates. Derivatives are only taken with respect to the coordinate
+    indices in dependencies. The metric is initially evaluated at coordinate
+    tuple coord.
+    """
+    assert (method in ('central', 'complex')), "Method must be 'central' or 'complex'"
+    assert (step > 0), "Step must be > 0"
+    assert (all(l >= 0 and l < 4 for l in dependencies)), "Coordinate indices must be in range 0..3"
+    assert (cacheSize >= 0), "Cache size must be >= 0"
+
+    super(numericalMetric, self).__init__()
+    self.name = name
+    self.matrixFunction = matrixFunction
+    self.step = step
+    self.method = method
+    self.dependencies = tuple(sorted(dependencies))
+    self.cacheSize = cacheSize
+    # Shared between copies of this metric, values are read-only
+    self.cache = collections.OrderedDict()
+    self.updateCoords(coord)
+
+  def evaluateBatch(self, coords):
+    """
+    Returns matrix elements and Christoffel symbols at N coordinate tuples,
+    given as (N,4) array, in arrays of shape (N,4,4) and (N,4,4,4)
+    """
+    coords = np.asarray(coords, dtype = np.float64)
+    assert (coords.ndim == 2 and coords.shape[1] == 4), "Coordinate array must have shape (N,4)"
+    nPoints = coords.shape[0]
+    nDirections = len(self.dependencies)
+
+    # Steps for each point and direction
+    steps = self.step*np.maximum(1, np.abs(coords[:,self.dependencies]))
+
+    # Evaluate base points and all stencil points in one call
+    if self.method == 'central':
+      stencil = np.repeat(coords[:,np.newaxis,:], 1+2*nDirections, axis = 1)
+      for d, l in enumerate(self.dependencies):
+        stencil[:,1+2*d,l] += steps[:,d]
+        stencil[:,2+2*d,l] -= steps[:,d]
+      values = np.asarray(self.matrixFunction(stencil.reshape(-1,4))).reshape(nPoints, 1+2*nDirections, 4, 4)
+      matrices = values[:,0]
+      derivatives = (values[:,1::2]-values[:,2::2])/(2*steps[:,:,np.newaxis,np.newaxis])
+    else:
+      stencil = np.repeat(coords[:,np.newaxis,:].astype(np.complex128), 1+nDirections, axis = 1)
+      for d, l in enumerate(self.dependencies):
+        stencil[:,1+d,l] += 1j*steps[:,d]
+      values = np.asarray(self.matrixFunction(stencil.reshape(-1,4))).reshape(nPoints, 1+nDirections, 4, 4)
+      matrices = np.real(values[:,0])
+      derivatives = np.imag(values[:,1:])/steps[:,:,np.newaxis,np.newaxis]
+
+    # Derivatives d_l g_jk for all directions, vanishing for other coordinates
+    dg = np.zeros((nPoints,4,4,4), dtype = np.float64)
+    dg[:,self.dependencies] = derivatives
+
+    # Combine derivatives to d_j g_lk + d_k g_lj - d_l g_jk with indices (l,j,k)
+    terms = np.einsum('njlk->nljk', dg) + np.einsum('nklj->nljk', dg) - dg
+    christoffels = 0.5*np.einsum('nil,nljk->nijk', np.linalg.inv(matrices), terms)
+    return np.ascontiguousarray(matrices, dtype = np.float64), christoffels
+
+  @ins.instrumented('metric.updateCoords')
+  def updateCoords(self, coord):
+    if isinstance(coord, np.ndarray):
+      assert (coord.shape == (4,)), "Coordinate tuple must have 4 components"
+    else:
+      assert (len(coord) == 4), "Coordinate tuple must have 4 components"
+
+    key = tuple(float(x) for x in coord)
+    if key in self.cache:
+      self.cache.move_to_end(key)
+      matrix, christoffel = self.cache[key]
+    else:
+      matrices, christoffels = self.evaluateBatch(np.array([key]))
+      matrix = matrices[0]
+      christoffel = christoffels[0]
+      matrix.flags.writeable = False
+      christoffel.flags.writeable = False
+      if self.cacheSize > 0:
+        self.cache[key] = (matrix, christoffel)
+        if len(self.cache) > self.cacheSize:
+          self.cache.popitem(last = False)
+
+    self.matrix[:] = matrix
+    self.christoffel[:] = christoffel
+    self.fingerprint = (self.name, id(self.matrixFunction), self.step, self.method, self.dependencies) + key
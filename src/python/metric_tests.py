@@ -1,10 +1,12 @@
 import numpy as np
+import pytest
 import metric as mt
 
 def test_metric():
   metric = mt.metric()
   v1 = np.array([1,2,3,4], dtype = np.float64)
   assert (metric.scalarProduct(v1, v1) == 0), "Expected zero result"
+  assert (np.array_equal(metric.scalarProducts(np.ones((3,4)), np.ones((3,4))), np.zeros(3))), "Expected zero result"
 
   # Test operators
   a = mt.metric()
@@ -14,6 +16,16 @@ def test_metric():
   assert (a != b), "Expected inequality"
   assert (not b != b), "Did not expect inequality"
 
+  # Copies and snapshots
+  c = b.copy()
+  assert (c == b and c is not b), "Expected equal copy"
+  assert (not c.isFrozen()), "Copy should be writeable"
+  s = c.snapshot()
+  assert (s == c and s is not c), "Expected equal snapshot"
+  assert (s.isFrozen()), "Snapshot should be frozen"
+  assert (s.snapshot() is s), "Snapshot of frozen metric should not be copied"
+  assert (not s.copy().isFrozen()), "Copy of frozen metric should be writeable"
+
 # -----------------------------------------------------------------------
 
 def test_minkowski():
@@ -27,6 +39,28 @@ def test_minkowski():
   metric2.updateCoords([1,2,3,4])
   assert (metric2 == metric), "updateCoords method should not change anything"
 
+  # Batch evaluation must return constant matrix and vanishing Christoffel symbols
+  matrices, christoffels = metric.evaluateBatch(np.random.rand(5,4))
+  assert (matrices.shape == (5,4,4) and christoffels.shape == (5,4,4,4)), "Unexpected shapes"
+  for i in range(5):
+    assert (np.array_equal(matrices[i], matrix)), "Unexpected matrix"
+  assert (np.array_equal(christoffels, np.zeros_like(christoffels))), "Expected vanishing Christoffel symbols"
+
+  # Contraction with empty sparsity pattern must vanish
+  assert (np.array_equal(metric.contractChristoffel(np.ones(4)), np.zeros(4))), "Expected zero result"
+  assert (np.array_equal(metric.contractChristoffelBatch(christoffels, np.ones((5,4))), np.zeros((5,4)))), "Expected zero result"
+  assert (np.array_equal(metric.geodesicAcceleration(np.ones(4), np.ones(4), np.ones(4)), np.zeros(4))), "Expected zero result"
+  assert (np.array_equal(metric.geodesicAccelerationBatch(np.ones((5,4)), np.ones((5,4))), np.zeros((5,4)))), "Expected zero result"
+  jacobian = metric.geodesicJacobian(np.ones(4), np.ones(4))
+  assert (np.array_equal(jacobian[0:4,4:8], np.eye(4)) and np.count_nonzero(jacobian) == 4), "Unexpected Jacobian"
+
+  # Batched scalar products must agree with individual ones
+  v = np.array([[1,2,3,4],[4,3,2,1],[1,1,0,0]], dtype = np.float64)
+  w = np.array([[0,1,0,1],[2,2,1,1],[1,-1,0,0]], dtype = np.float64)
+  products = metric.scalarProducts(v, w)
+  for i in range(v.shape[0]):
+    assert (np.isclose(products[i], metric.scalarProduct(v[i], w[i]))), "Unexpected scalar product"
+
 # -----------------------------------------------------------------------
 
 def test_schwarzschild():
@@ -48,3 +82,230 @@ def test_schwarzschild():
   matrix = metric.getMatrix()
   assert (np.isclose(matrix[0,0], 1)), "Time component does not converge to Minkowski"
   assert (np.isclose(matrix[1,1], -1)), "Radius component does not converge to Minkowski"
+
+  # Fingerprints identify metric parameters and coordinates
+  metric1 = mt.schwarzschild(rs, 3*rs, 0.25*np.pi)
+  metric2 = mt.schwarzschild(rs, 4*rs, 0.75*np.pi)
+  assert (metric1.getFingerprint() != metric2.getFingerprint()), "Expected different fingerprints"
+  assert (metric1 != metric2), "Did not expect equality"
+  metric2.updateCoords([1,3*rs,0.25*np.pi,1])
+  assert (metric1.getFingerprint() == metric2.getFingerprint()), "Expected same fingerprint"
+  assert (metric1 == metric2), "Expected equality"
+  assert (metric1 != mt.schwarzschild(2*rs, 3*rs, 0.25*np.pi)), "Did not expect equality"
+
+  # Metrics without fingerprint are compared numerically
+  metric2.fingerprint = None
+  assert (metric1 == metric2), "Expected equality"
+  metric2.updateCoords([0,5*rs,0.25*np.pi,0])
+  metric2.fingerprint = None
+  assert (metric1 != metric2), "Did not expect equality"
+
+  # Frozen metrics cannot be modified
+  frozen = metric.snapshot()
+  try:
+    frozen.updateCoords([0,2*rs,0.5*np.pi,0])
+    modified = True
+  except ValueError:
+    modified = False
+  assert (not modified), "Frozen metric should be read-only"
+
+  # Batch evaluation must agree with updateCoords and must not modify metric
+  coords = np.array([[0,3*rs,0.1,0],[1,5*rs,0.5*np.pi,2],[2,0.5*rs,2.5,4],[3,7*rs,np.pi,1]], dtype = np.float64)
+  reference = metric.copy()
+  matrices, christoffels = metric.evaluateBatch(coords)
+  assert (metric == reference), "Batch evaluation should not modify metric"
+  genericMatrices, genericChristoffels = mt.metric.evaluateBatch(metric, coords)
+  for i in range(coords.shape[0]):
+    metric.updateCoords(coords[i])
+    assert (np.allclose(matrices[i], metric.getMatrix())), "Unexpected matrix"
+    assert (np.allclose(christoffels[i], metric.getChristoffel())), "Unexpected Christoffel symbols"
+    assert (np.allclose(genericMatrices[i], metric.getMatrix())), "Unexpected matrix"
+    assert (np.allclose(genericChristoffels[i], metric.getChristoffel())), "Unexpected Christoffel symbols"
+
+  # Sparsity pattern must cover all non-zero Christoffel symbols
+  flat, j, k, scatter = metric.getChristoffelPattern()
+  mask = np.zeros(64, dtype = bool)
+  mask[flat] = True
+  mask = mask.reshape(4,4,4)
+  mask = np.logical_or(mask, np.transpose(mask, (0,2,1)))
+  assert (np.all(christoffels[:,np.logical_not(mask)] == 0)), "Non-zero Christoffel symbols outside of pattern"
+
+  # Sparse contractions must agree with dense contractions
+  vectors = np.random.rand(coords.shape[0],4)
+  contractions = metric.contractChristoffelBatch(christoffels, vectors)
+  for i in range(coords.shape[0]):
+    metric.updateCoords(coords[i])
+    dense = np.einsum('ijk,j,k', metric.getChristoffel(), vectors[i], vectors[i])
+    assert (np.allclose(metric.contractChristoffel(vectors[i]), dense)), "Unexpected contraction"
+    assert (np.allclose(contractions[i], dense)), "Unexpected batch contraction"
+
+  # Fused geodesic acceleration must agree with generic version and must not modify metric
+  for i in range(coords.shape[0]):
+    reference = metric.copy()
+    fused = metric.geodesicAcceleration(coords[i], vectors[i], np.empty(4))
+    assert (metric == reference), "Fused geodesic acceleration should not modify metric"
+    generic = mt.metric.geodesicAcceleration(metric, coords[i], vectors[i], np.empty(4))
+    assert (np.allclose(fused, generic)), "Unexpected geodesic acceleration"
+
+  # Batched geodesic accelerations must agree with individual ones
+  batch = metric.geodesicAccelerationBatch(coords, vectors)
+  generic = mt.metric.geodesicAccelerationBatch(metric, coords, vectors)
+  for i in range(coords.shape[0]):
+    single = metric.geodesicAcceleration(coords[i], vectors[i], np.empty(4))
+    assert (np.allclose(batch[i], single)), "Unexpected batched geodesic acceleration"
+    assert (np.allclose(generic[i], single)), "Unexpected batched geodesic acceleration"
+
+  # Analytic Jacobian must agree with central differences of the geodesic acceleration
+  assert (mt.metric.geodesicJacobian(metric, coords[0], vectors[0]) is None), "Expected no generic Jacobian"
+  def rhs(x):
+    return np.concatenate((x[4:8], metric.geodesicAcceleration(x[0:4], x[4:8], np.empty(4))))
+  h = 1.0e-6
+  for i in range(coords.shape[0]):
+    # Cotangent is set to 0 on the polar axis, where it is not differentiable
+    if np.sin(coords[i,2]) < 1.0e-3:
+      continue
+    x = np.concatenate((coords[i], vectors[i]))
+    jacobian = metric.geodesicJacobian(coords[i], vectors[i])
+    for l in range(8):
+      step = np.zeros(8)
+      step[l] = h
+      assert (np.allclose(jacobian[:,l], (rhs(x+step)-rhs(x-step))/(2*h), atol = 1.0e-6)), "Unexpected Jacobian"
+
+# -----------------------------------------------------------------------
+
+def test_tabulatedMetric():
+  rs = 1.0
+  exact = mt.schwarzschild(rs, 10*rs, 0.5*np.pi)
+  grid = {1: np.linspace(3*rs, 30*rs, 200), 2: np.linspace(0.3, np.pi-0.3, 100)}
+  metric = mt.tabulatedMetric(exact, grid, [0, 10*rs, 0.5*np.pi, 0])
+  assert (metric.getName() == exact.getName()), "Expected name of wrapped metric"
+  assert (np.isfinite(metric.matrixErrorBound) and np.isfinite(metric.christoffelErrorBound)), "Expected finite error bounds"
+
+  # Interpolation errors must stay within the error bounds
+  coords = np.zeros((1000,4))
+  coords[:,1] = np.random.uniform(3*rs, 30*rs, 1000)
+  coords[:,2] = np.random.uniform(0.3, np.pi-0.3, 1000)
+  matrices, christoffels = metric.evaluateBatch(coords)
+  exactMatrices, exactChristoffels = exact.evaluateBatch(coords)
+  assert (np.max(np.abs(matrices-exactMatrices)) <= metric.matrixErrorBound), "Matrix error exceeds bound"
+  assert (np.max(np.abs(christoffels-exactChristoffels)) <= metric.christoffelErrorBound), "Christoffel error exceeds bound"
+
+  # Single evaluations must agree with batch evaluations and be exact on grid nodes
+  for i in range(10):
+    metric.updateCoords(coords[i])
+    assert (np.allclose(metric.getMatrix(), matrices[i])), "Unexpected matrix"
+    assert (np.allclose(metric.getChristoffel(), christoffels[i])), "Unexpected Christoffel symbols"
+  node = [0, grid[1][17], grid[2][42], 0]
+  metric.updateCoords(node)
+  exact.updateCoords(node)
+  assert (np.allclose(metric.getMatrix(), exact.getMatrix())), "Expected exact matrix on grid node"
+  assert (np.allclose(metric.getChristoffel(), exact.getChristoffel())), "Expected exact Christoffel symbols on grid node"
+  assert (metric == exact), "Expected equality on grid node"
+
+  # Fingerprints depend on tabulated coordinates only
+  other = metric.copy()
+  other.updateCoords([5, grid[1][17], grid[2][42], 3])
+  assert (other.getFingerprint() == metric.getFingerprint()), "Expected same fingerprint"
+
+# -----------------------------------------------------------------------
+
+def test_symbolicMetric():
+  sympy = pytest.importorskip("sympy")
+  t, r, theta, phi, rsSymbol = sympy.symbols('t r theta phi r_s')
+
+  # Schwarzschild metric must agree with hand-coded version
+  rs = 1.0
+  g = sympy.diag(1-rsSymbol/r, -1/(1-rsSymbol/r), -r**2, -r**2*sympy.sin(theta)**2)
+  metric = mt.symbolicMetric('Schwarzschild', (t, r, theta, phi), g, [0, 10*rs, 1.0, 0], {rsSymbol: rs})
+  exact = mt.schwarzschild(rs, 10*rs, 1.0)
+  assert (metric == exact), "Expected equality with hand-coded metric"
+  assert (len(metric.christoffelExpressions) == 9), "Unexpected number of non-zero Christoffel symbols"
+  assert (metric.dependencies == (1,2)), "Metric should only depend on radius and polar angle"
+
+  coords = np.zeros((20,4))
+  coords[:,1] = np.random.uniform(3*rs, 30*rs, 20)
+  coords[:,2] = np.random.uniform(0.3, np.pi-0.3, 20)
+  vectors = np.random.rand(20,4)
+  matrices, christoffels = metric.evaluateBatch(coords)
+  exactMatrices, exactChristoffels = exact.evaluateBatch(coords)
+  assert (np.allclose(matrices, exactMatrices)), "Unexpected matrices"
+  assert (np.allclose(christoffels, exactChristoffels)), "Unexpected Christoffel symbols"
+  assert (np.allclose(metric.geodesicAccelerationBatch(coords, vectors),
+                      exact.geodesicAccelerationBatch(coords, vectors))), "Unexpected batched geodesic acceleration"
+  for i in range(coords.shape[0]):
+    metric.updateCoords(coords[i])
+    assert (np.allclose(metric.getChristoffel(), christoffels[i])), "Unexpected Christoffel symbols"
+    assert (np.allclose(metric.geodesicAcceleration(coords[i], vectors[i], np.empty(4)),
+                        exact.geodesicAcceleration(coords[i], vectors[i], np.empty(4)))), "Unexpected geodesic acceleration"
+    assert (np.allclose(metric.geodesicJacobian(coords[i], vectors[i]),
+                        exact.geodesicJacobian(coords[i], vectors[i]))), "Unexpected Jacobian"
+
+  # Flat FLRW metric with scale factor a(t) = t^(2/3)
+  x, y, z = sympy.symbols('x y z')
+  a = t**sympy.Rational(2,3)
+  metric = mt.symbolicMetric('FLRW', (t, x, y, z), sympy.diag(1, -a**2, -a**2, -a**2), [2.0, 0, 0, 0])
+  scale = 2.0**(2/3)
+  rate = 2/3*2.0**(-1/3)
+  christoffel = metric.getChristoffel()
+  for i in range(1,4):
+    assert (np.isclose(christoffel[0,i,i], scale*rate)), "Unexpected Christoffel symbol gamma^0_ii"
+    assert (np.isclose(christoffel[i,0,i], rate/scale)), "Unexpected Christoffel symbol gamma^i_0i"
+  assert (metric.dependencies == (0,)), "Metric should only depend on time"
+
+  # Metrics with the same name but different matrix elements must differ
+  r, theta = sympy.symbols('r theta')
+  a = mt.symbolicMetric('custom', (t, r, theta, x), sympy.diag(1, -1, -r**2, -r**2*sympy.sin(theta)**2), [0, 2.0, 1.0, 0])
+  b = mt.symbolicMetric('custom', (t, r, theta, x), sympy.diag(2, -1, -r**2, -r**2*sympy.sin(theta)**2), [0, 2.0, 1.0, 0])
+  assert (a.getFingerprint() != b.getFingerprint()), "Expected different fingerprints"
+  assert (a != b), "Expected different metrics"
+  assert (a.copy() == a), "Expected equal copies"
+
+# -----------------------------------------------------------------------
+
+def test_numericalMetric():
+  rs = 1.0
+  exact = mt.schwarzschild(rs, 10*rs, 1.0)
+
+  # Schwarzschild matrix elements that can be evaluated at complex coordinates
+  def schwarzschildMatrix(coords):
+    r = coords[:,1]
+    sinTheta = np.sin(coords[:,2])
+    matrices = np.zeros((coords.shape[0],4,4), dtype = coords.dtype)
+    matrices[:,0,0] = 1-rs/r
+    matrices[:,1,1] = -1/(1-rs/r)
+    matrices[:,2,2] = -r*r
+    matrices[:,3,3] = -r*r*sinTheta*sinTheta
+    return matrices
+
+  coords = np.zeros((20,4))
+  coords[:,1] = np.random.uniform(3*rs, 30*rs, 20)
+  coords[:,2] = np.random.uniform(0.3, np.pi-0.3, 20)
+  exactMatrices, exactChristoffels = exact.evaluateBatch(coords)
+  for method in ['central', 'complex']:
+    metric = mt.numericalMetric('Schwarzschild', schwarzschildMatrix, [0, 10*rs, 1.0, 0], method = method)
+    assert (metric == exact), "Expected equality with analytic metric"
+    matrices, christoffels = metric.evaluateBatch(coords)
+    assert (np.allclose(matrices, exactMatrices)), "Unexpected matrices"
+    assert (np.allclose(christoffels, exactChristoffels, atol = 1.0e-8)), "Unexpected Christoffel symbols"
+
+  # Restricting derivatives to the coordinates the metric depends on must not change results
+  metric = mt.numericalMetric('Schwarzschild', schwarzschildMatrix, [0, 10*rs, 1.0, 0], dependencies = (1,2), cacheSize = 2)
+  matrices, christoffels = metric.evaluateBatch(coords)
+  assert (np.allclose(christoffels, exactChristoffels, atol = 1.0e-8)), "Unexpected Christoffel symbols"
+
+  # Metrics from the same function with different derivative settings are not equal
+  full = mt.numericalMetric('Schwarzschild', schwarzschildMatrix, [0, 10*rs, 1.0, 0])
+  radial = mt.numericalMetric('Schwarzschild', schwarzschildMatrix, [0, 10*rs, 1.0, 0], dependencies = (1,))
+  assert (full != radial), "Expected different metrics for different dependencies"
+  assert (full.fingerprint != mt.numericalMetric('Schwarzschild', schwarzschildMatrix, [0, 10*rs, 1.0, 0], step = 1.0e-4).fingerprint), "Expected different fingerprints for different steps"
+  assert (full.fingerprint != mt.numericalMetric('Schwarzschild', schwarzschildMatrix, [0, 10*rs, 1.0, 0], method = 'complex').fingerprint), "Expected different fingerprints for different methods"
+
+  # Repeated evaluations at the same coordinates are served from the bounded cache
+  for i in range(3):
+    metric.updateCoords(coords[i])
+    assert (np.allclose(metric.getChristoffel(), christoffels[i])), "Unexpected Christoffel symbols"
+  assert (len(metric.cache) == 2), "Unexpected cache size"
+  cached = metric.cache[tuple(coords[2])]
+  metric.updateCoords(coords[2])
+  assert (metric.cache[tuple(coords[2])] is cached), "Expected cached result"
+  assert (np.allclose(metric.getChristoffel(), christoffels[2])), "Unexpected Christoffel symbols"
@@ -0,0 +1,30 @@
+"""
+Start conditions of common worldlines in Schwarzschild spacetime, shared by
+tests and benchmarks.
+"""
+
+import numpy as np
+import fourvector as fv
+import metric as mt
+import worldline as wl
+
+def circularOrbit(rs, r0, fraction = 1):
+  """
+  Returns the worldline of a particle in stable circular orbit at radius r0
+  in the equatorial plane of Schwarzschild spacetime with Schwarzschild
+  radius rs. The orbital velocity is scaled by fraction, fraction < 1 yields
+  an eccentric orbit.
+  """
+  vphi0 = fraction*np.sqrt(rs/(2*r0*r0*(r0-3*rs/2)))
+  vt0 = np.sqrt((1+r0*r0*vphi0*vphi0)/(1-rs/r0))
+  vel0 = fv.particle([vt0,0,0,vphi0], mt.schwarzschild(rs,r0,0.5*np.pi), 1)
+  return wl.worldline([0,r0,0.5*np.pi,0], vel0)
+
+def radialInfall(rs, r0):
+  """
+  Returns the worldline of a particle falling radially from rest at radius
+  r0 in the equatorial plane of Schwarzschild spacetime with Schwarzschild
+  radius rs
+  """
+  vel0 = fv.particle([1/np.sqrt(1-rs/r0),0,0,0], mt.schwarzschild(rs,r0,0.5*np.pi), 1)
+  return wl.worldline([0,r0,0.5*np.pi,0], vel0)
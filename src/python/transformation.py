@@ -1,4 +1,5 @@
 import numpy as np
+import functools
 
 # Use "new-style" classes for easier inheritance
 __metaclass__ = type
@@ -14,16 +15,37 @@ class transformation:
   def getInvMatrix(self):
     return self.invmatrix
 
+  def __matmul__(self, other):
+    """
+    Composition T2 @ T1 of two transformations, which is equivalent to
+    applying T1 first and T2 second. Matrix and inverse matrix of the
+    composition are multiplied once,
+
+    T = T2 * T1
+    T^-1 = T1^-1 * T2^-1
+
+    so that chains of transformations are applied in a single step. Other
+    operands are left to their reflected operator, e.g. for stacks, see
+    transformationStack.__rmatmul__.
+    """
+    if not isinstance(other, transformation):
+      return NotImplemented
+    result = transformation()
+    result.matrix = np.matmul(self.matrix, other.matrix)
+    result.invmatrix = np.matmul(other.invmatrix, self.invmatrix)
+    return result
+
   def transformContraVector(self, v):
     """
     Transforms column vectors (1-times contravariant tensors).
 
     x'^i = T^i_j * x^j  <=>  x' = Tx
     
-    Matrix index convention is row-column
+    Matrix index convention is row-column. Stacks of N vectors with shape
+    (N,4) are transformed row by row in one call.
     """
-    # See transformation rule for x^j above    
-    return np.einsum('ij,j', self.matrix, v)
+    # See transformation rule for x^j above, applied to the last axis of v
+    return np.matmul(v, self.matrix.T)
 
   def transformCoMatrix(self, m):
     """
@@ -56,9 +78,132 @@ class transformation:
     which results in
 
     g' = T^-1^t g T^-1
+
+    Stacks of N matrices with shape (N,4,4) are transformed in one call.
     """
-    # See transformation rule for g_k_l above    
-    return np.einsum('ki,kl,lj', self.invmatrix, m, self.invmatrix)
+    # See transformation rule for g_k_l above, applied to the last two axes of m
+    return np.matmul(np.matmul(self.invmatrix.T, m), self.invmatrix)
+
+# -----------------------------------------------------------------------
+
+# Maximum number of rotation and boost matrices kept in the LRU caches,
+# see setCacheSize
+cacheSize = 1024
+
+def _unitVector(axis):
+  """
+  Returns the spatial unit vector along a coordinate axis 1..3 or along a
+  direction given by 3 components as hashable tuple
+  """
+  if isinstance(axis, (int, np.integer)):
+    assert (axis > 0 and axis < 4), "Axis must be in range 1..3"
+    direction = np.zeros(3, dtype = np.float64)
+    direction[axis-1] = 1
+  else:
+    direction = np.array(axis, dtype = np.float64)
+    assert (direction.shape == (3,)), "Axis must be an integer number or a direction with 3 components"
+    norm = np.linalg.norm(direction)
+    assert (norm > 0), "Direction must not be zero"
+    direction /= norm
+  return tuple(direction.tolist())
+
+def _unitVectors(axes, size):
+  """
+  Returns array of shape (size,3) with spatial unit vectors, given either as
+  a single coordinate axis 1..3 or direction with 3 components that is used
+  for all elements, or as array of shape (size,3) with one direction each
+  """
+  if isinstance(axes, (int, np.integer)) or np.shape(axes) == (3,):
+    return np.tile(np.array(_unitVector(axes), dtype = np.float64), (size,1))
+  directions = np.array(axes, dtype = np.float64)
+  assert (directions.shape == (size,3)), "Directions must have shape (M,3)"
+  norms = np.linalg.norm(directions, axis = 1)
+  assert (np.all(norms > 0)), "Directions must not be zero"
+  return directions/norms[:,np.newaxis]
+
+def _rotationMatrixStack(axes, angles):
+  """
+  Returns matrices and inverse matrices with shape (M,4,4) for rotations
+  around M unit vectors with M angles using Rodrigues' formula,
+
+  R = cos(angle) * I + sin(angle) * [n]_x + (1-cos(angle)) * n n^t
+
+  where [n]_x is the cross product matrix of the axis n
+  """
+  cross = np.zeros((axes.shape[0],3,3), dtype = np.float64)
+  cross[:,0,1] = -axes[:,2]
+  cross[:,0,2] = axes[:,1]
+  cross[:,1,0] = axes[:,2]
+  cross[:,1,2] = -axes[:,0]
+  cross[:,2,0] = -axes[:,1]
+  cross[:,2,1] = axes[:,0]
+  cosAngles = np.cos(angles)[:,np.newaxis,np.newaxis]
+  sinAngles = np.sin(angles)[:,np.newaxis,np.newaxis]
+
+  matrices = np.zeros((axes.shape[0],4,4), dtype = np.float64)
+  matrices[:,0,0] = 1
+  matrices[:,1:,1:] = (cosAngles*np.eye(3) + sinAngles*cross
+                       + (1-cosAngles)*axes[:,:,np.newaxis]*axes[:,np.newaxis,:])
+
+  # Rotation matrices are orthogonal
+  invmatrices = np.transpose(matrices, (0,2,1)).copy()
+  return matrices, invmatrices
+
+def _boostMatrixStack(directions, betas):
+  """
+  Returns matrices and inverse matrices with shape (M,4,4) for boosts along
+  M unit vectors n at M speeds beta,
+
+  B^0_0 = gamma
+  B^0_i = B^i_0 = -gamma * beta * n_i
+  B^i_j = delta_ij + (gamma-1) * n_i * n_j
+  """
+  rapidities = np.arctanh(betas)
+  coshRapidities = np.cosh(rapidities)
+  matrices = np.zeros((directions.shape[0],4,4), dtype = np.float64)
+  matrices[:,0,0] = coshRapidities
+  matrices[:,0,1:] = matrices[:,1:,0] = -np.sinh(rapidities)[:,np.newaxis]*directions
+  matrices[:,1:,1:] = (np.eye(3) + (coshRapidities-1)[:,np.newaxis,np.newaxis]
+                       *directions[:,:,np.newaxis]*directions[:,np.newaxis,:])
+
+  # Off-diagonal time-space elements of inverse matrices change sign
+  invmatrices = matrices.copy()
+  invmatrices[:,0,1:] *= -1
+  invmatrices[:,1:,0] *= -1
+  return matrices, invmatrices
+
+def _rotationMatrices(axis, angle):
+  """
+  Returns read-only matrix and inverse matrix for a rotation around unit
+  vector axis, see _rotationMatrixStack
+  """
+  matrices, invmatrices = _rotationMatrixStack(np.array([axis], dtype = np.float64), np.array([angle]))
+  matrices.flags.writeable = False
+  invmatrices.flags.writeable = False
+  return matrices[0], invmatrices[0]
+
+def _boostMatrices(direction, beta):
+  """
+  Returns read-only matrix and inverse matrix for a boost along unit vector
+  direction at speed beta, see _boostMatrixStack
+  """
+  matrices, invmatrices = _boostMatrixStack(np.array([direction], dtype = np.float64), np.array([beta]))
+  matrices.flags.writeable = False
+  invmatrices.flags.writeable = False
+  return matrices[0], invmatrices[0]
+
+def setCacheSize(size):
+  """
+  Sets the maximum number of cached rotation and boost matrices and clears
+  the caches
+  """
+  global cacheSize, _cachedRotationMatrices, _cachedBoostMatrices
+  assert (size is None or size >= 0), "Cache size must be >= 0 or None for unbounded caches"
+  cacheSize = size
+  _cachedRotationMatrices = functools.lru_cache(maxsize = size)(_rotationMatrices)
+  _cachedBoostMatrices = functools.lru_cache(maxsize = size)(_boostMatrices)
+
+setCacheSize(cacheSize)
 
 # -----------------------------------------------------------------------
 
@@ -66,48 +211,50 @@ class lorentzRotation(transformation):
   """
   Rotations of contravariant vectors in counter-clockwise direction (for angle > 0)
   in a right-handed coordinate system; the inverse matrix is used for covariant
-  vectors
+  vectors. The rotation axis is either a coordinate axis 1..3 or a direction
+  given by 3 components. Repeated rotations are served from an LRU cache.
   """
   def __init__(self, axis, angle):
-    assert (isinstance(axis, int)), "Axis parameter must be an integer number"
-    assert (axis > 0 and axis < 4), "Axis must be in range 1..3"
     assert (isinstance(angle, (int, float))), "Angle parameter must be a number"
     self.axis = axis
     self.angle = angle
 
     super(lorentzRotation, self).__init__()
 
-    self.matrix[0,0] = 1
-    if axis == 1:
-      self.matrix[1,1] = 1
-      self.matrix[2,2] = self.matrix[3,3] = np.cos(self.angle)
-      self.matrix[2,3] = -np.sin(self.angle)
-      self.matrix[3,2] = np.sin(self.angle)
-    elif axis == 2:
-      self.matrix[2,2] = 1
-      self.matrix[1,1] = self.matrix[3,3] = np.cos(self.angle)
-      self.matrix[1,3] = np.sin(self.angle)
-      self.matrix[3,1] = -np.sin(self.angle)
-    elif axis == 3:
-      self.matrix[3,3] = 1
-      self.matrix[1,1] = self.matrix[2,2] = np.cos(self.angle)
-      self.matrix[1,2] = -np.sin(self.angle)
-      self.matrix[2,1] = np.sin(self.angle)
-
-    # Rotation matrices are orthogonal
-    self.invmatrix = np.transpose(self.matrix)
+    self.matrix, self.invmatrix = _cachedRotationMatrices(_unitVector(axis), float(angle))
+
+# -----------------------------------------------------------------------
+
+class quaternionRotation(lorentzRotation):
+  """
+  Rotations of contravariant vectors given by a quaternion q = (w,x,y,z),
+  which is normalised if necessary. This is the same as a rotation around
+  axis (x,y,z) with angle 2*atan2(|(x,y,z)|, w).
+  """
+  def __init__(self, q):
+    q = np.array(q, dtype = np.float64)
+    assert (q.shape == (4,)), "Quaternion must have 4 components"
+    assert (np.linalg.norm(q) > 0), "Quaternion must not be zero"
+    self.quaternion = q/np.linalg.norm(q)
+
+    norm = np.linalg.norm(self.quaternion[1:])
+    if norm > 0:
+      super(quaternionRotation, self).__init__(self.quaternion[1:].tolist(), 2*np.arctan2(norm, self.quaternion[0]))
+    else:
+      # Identity rotation, axis is arbitrary
+      super(quaternionRotation, self).__init__(3, 0.0)
 
 # -----------------------------------------------------------------------
 
 class lorentzBoost(transformation):
   """
   Boosts of contravariant vectors, the inverse matrix is used for covariant
-  vectors
+  vectors. The boost direction is either a coordinate axis 1..3 or a
+  direction given by 3 components. Repeated boosts are served from an LRU
+  cache.
   """
   def __init__(self, axis, beta):
-    assert (isinstance(axis, int)), "Axis parameter must be an integer number"
-    assert (axis > 0 and axis < 4), "Axis must be in range 1..3"
-    assert (isinstance(beta, (int, float))), "Angle parameter must be a number"
+    assert (isinstance(beta, (int, float))), "Beta parameter must be a number"
     assert (np.abs(beta) < 1), "Beta must be > -1 and < 1"
     self.axis = axis
     self.beta = beta
@@ -115,31 +262,116 @@ class lorentzBoost(transformation):
 
     super(lorentzBoost, self).__init__()
 
-    if axis == 1:
-      self.matrix[0,0] = np.cosh(self.rapidity)
-      self.matrix[0,1] = -np.sinh(self.rapidity)
-      self.matrix[1,0] = -np.sinh(self.rapidity)
-      self.matrix[1,1] = np.cosh(self.rapidity)
-      self.matrix[2,2] = 1
-      self.matrix[3,3] = 1
-    elif axis == 2:
-      self.matrix[0,0] = np.cosh(self.rapidity)
-      self.matrix[0,2] = -np.sinh(self.rapidity)
-      self.matrix[1,1] = 1
-      self.matrix[2,0] = -np.sinh(self.rapidity)
-      self.matrix[2,2] = np.cosh(self.rapidity)
-      self.matrix[3,3] = 1
-    elif axis == 3:
-      self.matrix[0,0] = np.cosh(self.rapidity)
-      self.matrix[0,3] = -np.sinh(self.rapidity)
-      self.matrix[1,1] = 1
-      self.matrix[2,2] = 1
-      self.matrix[3,0] = -np.sinh(self.rapidity)
-      self.matrix[3,3] = np.cosh(self.rapidity)
-
-    # Off-diagonal elements of inverse matrix change sign
-    self.invmatrix = -self.matrix
-    self.invmatrix[0,0] *= -1
-    self.invmatrix[1,1] *= -1
-    self.invmatrix[2,2] *= -1
-    self.invmatrix[3,3] *= -1
+    self.matrix, self.invmatrix = _cachedBoostMatrices(_unitVector(axis), float(beta))
+
+# -----------------------------------------------------------------------
+
+class transformationStack:
+  """
+  Stack of M transformations, e.g. frames of many observers, stored as
+  arrays of shape (M,4,4) for matrices and inverse matrices, which are
+  applied to vectors and matrices in single broadcasted operations
+  """
+  def __init__(self, matrices, invmatrices):
+    self.matrices = np.array(matrices, dtype = np.float64)
+    self.invmatrices = np.array(invmatrices, dtype = np.float64)
+    assert (self.matrices.ndim == 3 and self.matrices.shape[1:] == (4,4)), "Matrices must have shape (M,4,4)"
+    assert (self.invmatrices.shape == self.matrices.shape), "Inverse matrices must have shape (M,4,4)"
+
+  def getMatrices(self):
+    return self.matrices
+
+  def getInvMatrices(self):
+    return self.invmatrices
+
+  def __len__(self):
+    return self.matrices.shape[0]
+
+  def __getitem__(self, index):
+    """
+    Returns the transformation with given index
+    """
+    result = transformation()
+    result.matrix = self.matrices[index].copy()
+    result.invmatrix = self.invmatrices[index].copy()
+    return result
+
+  def __matmul__(self, other):
+    """
+    Composition of each transformation in this stack with a single
+    transformation, or element-wise with another stack of the same length,
+    see transformation.__matmul__
+    """
+    assert (isinstance(other, (transformationStack, transformation))), "Argument must be transformationStack or transformation type"
+    if isinstance(other, transformationStack):
+      assert (len(self) == len(other)), "Stacks must have same length"
+      return transformationStack(np.matmul(self.matrices, other.matrices),
+                                 np.matmul(other.invmatrices, self.invmatrices))
+    return transformationStack(np.matmul(self.matrices, other.matrix),
+                               np.matmul(other.invmatrix, self.invmatrices))
+
+  def __rmatmul__(self, other):
+    """
+    Composition of a single transformation with each transformation in this
+    stack, see transformation.__matmul__
+    """
+    assert (isinstance(other, transformation)), "Argument must be transformation type"
+    return transformationStack(np.matmul(other.matrix, self.matrices),
+                               np.matmul(self.invmatrices, other.invmatrix))
+
+  def transformContraVector(self, v):
+    """
+    Transforms a contravariant vector with shape (4,) or a batch of N vectors
+    with shape (N,4) with every transformation of the stack, see
+    transformation.transformContraVector. Results have shape (M,4) or (M,N,4).
+    """
+    v = np.asarray(v, dtype = np.float64)
+    if v.ndim == 1:
+      return np.matmul(self.matrices, v)
+    return np.matmul(v, np.transpose(self.matrices, (0,2,1)))
+
+  def transformCoMatrix(self, m):
+    """
+    Transforms a bilinear form with shape (4,4) or a batch of N bilinear forms
+    with shape (N,4,4) with every transformation of the stack, see
+    transformation.transformCoMatrix. Results have shape (M,4,4) or
+    (M,N,4,4).
+    """
+    m = np.asarray(m, dtype = np.float64)
+    # Insert axes for the batch of bilinear forms
+    shape = (len(self),) + (1,)*(m.ndim-2) + (4,4)
+    invmatrices = self.invmatrices.reshape(shape)
+    return np.matmul(np.matmul(np.swapaxes(invmatrices, -1, -2), m), invmatrices)
+
+# -----------------------------------------------------------------------
+
+class lorentzRotationStack(transformationStack):
+  """
+  Stack of rotations with M angles, around a common axis given as coordinate
+  axis 1..3 or direction with 3 components, or around M directions given as
+  array of shape (M,3), see lorentzRotation
+  """
+  def __init__(self, axes, angles):
+    angles = np.array(angles, dtype = np.float64)
+    assert (angles.ndim == 1), "Angles must be a one-dimensional array"
+    self.axes = _unitVectors(axes, angles.shape[0])
+    self.angles = angles
+    matrices, invmatrices = _rotationMatrixStack(self.axes, self.angles)
+    super(lorentzRotationStack, self).__init__(matrices, invmatrices)
+
+# -----------------------------------------------------------------------
+
+class lorentzBoostStack(transformationStack):
+  """
+  Stack of boosts with M speeds beta, along a common axis given as coordinate
+  axis 1..3 or direction with 3 components, or along M directions given as
+  array of shape (M,3), see lorentzBoost
+  """
+  def __init__(self, axes, betas):
+    betas = np.array(betas, dtype = np.float64)
+    assert (betas.ndim == 1), "Betas must be a one-dimensional array"
+    assert (np.all(np.abs(betas) < 1)), "Beta must be > -1 and < 1"
+    self.axes = _unitVectors(axes, betas.shape[0])
+    self.betas = betas
+    matrices, invmatrices = _boostMatrixStack(self.axes, self.betas)
+    super(lorentzBoostStack, self).__init__(matrices, invmatrices)
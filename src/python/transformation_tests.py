@@ -1,4 +1,5 @@
 import numpy as np
+import pytest
 import transformation as tf
 
 def test_transformation():
@@ -122,3 +123,141 @@ def test_lorentzBoost():
   for axis in range(1,4):
     boost = tf.lorentzBoost(axis, beta)
     assert (np.allclose(boost.transformCoMatrix(m), m)), "Minkowski metric not invariant"
+
+# -----------------------------------------------------------------------
+
+def test_composition():
+
+  # Chain of boosts and rotations
+  chain = [tf.lorentzBoost(1, 0.3), tf.lorentzRotation(3, 0.7), tf.lorentzBoost(2, -0.6), tf.lorentzRotation(1, -1.1)]
+  composed = chain[3] @ chain[2] @ chain[1] @ chain[0]
+  assert (np.allclose(np.matmul(composed.getMatrix(), composed.getInvMatrix()), np.eye(4, dtype = np.float64))), "Expected diagonal matrix"
+
+  # Composed transformation must agree with sequential application
+  v = np.array([1.2, -0.4, 0.3, 2.1], dtype = np.float64)
+  w = v
+  for trafo in chain:
+    w = trafo.transformContraVector(w)
+  assert (np.allclose(composed.transformContraVector(v), w)), "Unexpected result of composed transformation"
+
+  m = np.diagflat([2,-1,-3,-1]).astype(np.float64)
+  n = m
+  for trafo in chain:
+    n = trafo.transformCoMatrix(n)
+  assert (np.allclose(composed.transformCoMatrix(m), n)), "Unexpected result of composed transformation"
+
+  # Batches of vectors and matrices must agree with individual transformations
+  vectors = np.random.rand(10,4)
+  transformed = composed.transformContraVector(vectors)
+  assert (transformed.shape == (10,4)), "Unexpected shape"
+  matrices = np.random.rand(10,4,4)
+  transformedMatrices = composed.transformCoMatrix(matrices)
+  assert (transformedMatrices.shape == (10,4,4)), "Unexpected shape"
+  for i in range(10):
+    assert (np.allclose(transformed[i], composed.transformContraVector(vectors[i]))), "Unexpected result for vector batch"
+    assert (np.allclose(transformedMatrices[i], composed.transformCoMatrix(matrices[i]))), "Unexpected result for matrix batch"
+
+  # Minkowski metric must be invariant
+  m = np.diagflat([1,-1,-1,-1])
+  assert (np.allclose(composed.transformCoMatrix(m), m)), "Minkowski metric not invariant"
+
+# -----------------------------------------------------------------------
+
+def test_arbitraryDirections():
+
+  # Transformations along coordinate axes given as directions must agree with integer axes
+  for axis in range(1,4):
+    direction = np.zeros(3)
+    direction[axis-1] = 2.5
+    assert (np.allclose(tf.lorentzRotation(direction, 0.4).getMatrix(), tf.lorentzRotation(axis, 0.4).getMatrix())), "Unexpected rotation matrix"
+    assert (np.allclose(tf.lorentzBoost(direction, 0.4).getMatrix(), tf.lorentzBoost(axis, 0.4).getMatrix())), "Unexpected boost matrix"
+
+  # Boost along arbitrary direction
+  direction = np.array([1,-2,0.5], dtype = np.float64)
+  n = direction/np.linalg.norm(direction)
+  beta = 0.7
+  gamma = 1.0/np.sqrt(1-beta*beta)
+  boost = tf.lorentzBoost(direction, beta)
+  assert (np.allclose(np.matmul(boost.getMatrix(), boost.getInvMatrix()), np.eye(4, dtype = np.float64))), "Expected diagonal matrix"
+  e0 = np.array([1,0,0,0], dtype = np.float64)
+  assert (np.allclose(boost.transformContraVector(e0), np.concatenate(([gamma], -gamma*beta*n)))), "Unexpected boosted vector"
+  perpendicular = np.concatenate(([0], np.cross(n, [0,0,1])))
+  assert (np.allclose(boost.transformContraVector(perpendicular), perpendicular)), "Perpendicular component is boosted"
+  m = np.diagflat([1,-1,-1,-1])
+  assert (np.allclose(boost.transformCoMatrix(m), m)), "Minkowski metric not invariant"
+
+  # Rotation around arbitrary axis
+  angle = 0.9
+  rot = tf.lorentzRotation(direction, angle)
+  assert (np.isclose(np.linalg.det(rot.getMatrix()), 1)), "Expected determinant 1"
+  axis = np.concatenate(([0], n))
+  assert (np.allclose(rot.transformContraVector(axis), axis)), "Component on rot axis is not invariant"
+  rotated = rot.transformContraVector(perpendicular)
+  assert (np.isclose(np.dot(rotated[1:], perpendicular[1:]), np.cos(angle)*np.dot(perpendicular[1:], perpendicular[1:]))), "Unexpected rotation angle"
+  assert (np.allclose(rot.transformCoMatrix(m), m)), "Minkowski metric not invariant under rotation"
+
+  # Quaternion rotation must agree with axis-angle rotation
+  q = np.concatenate(([np.cos(0.5*angle)], np.sin(0.5*angle)*n))
+  assert (np.allclose(tf.quaternionRotation(3*q).getMatrix(), rot.getMatrix())), "Unexpected quaternion rotation"
+  assert (np.allclose(tf.quaternionRotation([1,0,0,0]).getMatrix(), np.eye(4))), "Expected identity"
+
+  # Repeated transformations are served from cache
+  assert (tf.lorentzBoost(direction, beta).getMatrix() is boost.getMatrix()), "Expected cached boost matrix"
+  assert (tf.lorentzRotation(direction, angle).getMatrix() is rot.getMatrix()), "Expected cached rotation matrix"
+  tf.setCacheSize(0)
+  assert (tf.lorentzBoost(direction, beta).getMatrix() is not boost.getMatrix()), "Did not expect cached boost matrix"
+  tf.setCacheSize(1024)
+
+# -----------------------------------------------------------------------
+
+def test_transformationStack():
+
+  # Stack of boosts along common axis must agree with individual boosts
+  betas = np.linspace(-0.9, 0.9, 7)
+  boosts = tf.lorentzBoostStack(2, betas)
+  assert (len(boosts) == 7 and boosts.getMatrices().shape == (7,4,4)), "Unexpected stack shape"
+  vectors = np.random.rand(5,4)
+  transformed = boosts.transformContraVector(vectors)
+  assert (transformed.shape == (7,5,4)), "Unexpected shape of transformed vectors"
+  assert (boosts.transformContraVector(vectors[0]).shape == (7,4)), "Unexpected shape of transformed vector"
+  for i in range(len(betas)):
+    boost = tf.lorentzBoost(2, betas[i])
+    assert (np.allclose(boosts.getMatrices()[i], boost.getMatrix())), "Unexpected boost matrix"
+    assert (np.allclose(boosts.getInvMatrices()[i], boost.getInvMatrix())), "Unexpected inverse boost matrix"
+    assert (np.allclose(boosts[i].getMatrix(), boost.getMatrix())), "Unexpected boost matrix"
+    for j in range(vectors.shape[0]):
+      assert (np.allclose(transformed[i,j], boost.transformContraVector(vectors[j]))), "Unexpected transformed vector"
+
+  # Stack of rotations around individual axes
+  axes = np.random.rand(7,3) + 0.1
+  angles = np.linspace(0, 2*np.pi, 7)
+  rotations = tf.lorentzRotationStack(axes, angles)
+  for i in range(len(angles)):
+    assert (np.allclose(rotations.getMatrices()[i], tf.lorentzRotation(axes[i], angles[i]).getMatrix())), "Unexpected rotation matrix"
+
+  # Composed stacks and bilinear forms
+  composed = rotations @ boosts @ tf.lorentzRotation(1, 0.3)
+  m = np.diagflat([1,-1,-1,-1])
+  invariant = composed.transformCoMatrix(m)
+  assert (invariant.shape == (7,4,4)), "Unexpected shape of transformed matrices"
+  assert (np.allclose(invariant, m)), "Minkowski metric not invariant"
+  assert (np.allclose(np.matmul(composed.getMatrices(), composed.getInvMatrices()), np.eye(4))), "Expected diagonal matrices"
+  matrices = np.random.rand(5,4,4)
+  transformedMatrices = composed.transformCoMatrix(matrices)
+  assert (transformedMatrices.shape == (7,5,4,4)), "Unexpected shape of transformed matrices"
+  for i in range(len(composed)):
+    for j in range(matrices.shape[0]):
+      assert (np.allclose(transformedMatrices[i,j], composed[i].transformCoMatrix(matrices[j]))), "Unexpected transformed matrix"
+
+  # A single transformation can be composed with a stack from either side
+  single = tf.lorentzBoost(3, 0.4)
+  for stack in [single @ boosts, boosts @ single]:
+    assert (isinstance(stack, tf.transformationStack) and len(stack) == len(boosts)), "Expected stack"
+  left = single @ boosts
+  right = boosts @ single
+  for i in range(len(boosts)):
+    assert (np.allclose(left.getMatrices()[i], (single @ boosts[i]).getMatrix())), "Unexpected composed matrix"
+    assert (np.allclose(left.getInvMatrices()[i], (single @ boosts[i]).getInvMatrix())), "Unexpected composed inverse matrix"
+    assert (np.allclose(right.getMatrices()[i], (boosts[i] @ single).getMatrix())), "Unexpected composed matrix"
+  with pytest.raises(TypeError):
+    single @ 2.0
@@ -1,9 +1,16 @@
 import numpy as np
 import scipy.integrate as spi
+import scipy.optimize as spo
+import concurrent.futures as cf
+import os
+import math
 import fourvector as fv
+import instrumentation as ins
+import cache as ch
 import copy
 
-def geodesicRHS(s, x, metric):
+@ins.instrumented('geodesicRHS')
+def geodesicRHS(s, x, metric, out = None):
   """
   Right-hand side of geodesic equations as a system of first-order
   ODEs in coordinate location x and velocity v as functions of curve
@@ -12,13 +19,315 @@ def geodesicRHS(s, x, metric):
   x'^i = v^i
   v'^i = -gamma^i_jk * v^j * v^k
 
-  where gamma^i_jk are the Christoffel symbols for given metric.
+  where gamma^i_jk are the Christoffel symbols for given metric. The
+  result is written into array out if given, using the fused geodesic
+  acceleration of the metric where available.
+  """
+  if out is None:
+    # Solvers keep references to returned arrays, so that a new array is
+    # needed for every call
+    out = np.empty(8, dtype = np.float64)
+  out[0:4] = x[4:8]
+  metric.geodesicAcceleration(x[0:4], x[4:8], out[4:8])
+  return out
+
+# SciPy solvers for geodesic integrations
+explicitMethods = ('RK23', 'RK45', 'DOP853')
+implicitMethods = ('Radau', 'BDF', 'LSODA')
+
+def _solverOptions(metric, method, y0):
+  """
+  Returns a dictionary of keyword arguments for the SciPy solver with given
+  method for the geodesic equations in given metric, starting at state y0.
+  Implicit solvers get the analytic Jacobian of the metric if available,
+  see metric.geodesicJacobian.
+  """
+  assert (method in explicitMethods+implicitMethods), "Unknown integration method"
+  options = {}
+  if method in implicitMethods and metric.geodesicJacobian(y0[0:4], y0[4:8]) is not None:
+    options['jac'] = lambda t,y: metric.geodesicJacobian(y[0:4], y[4:8])
+  return options
+
+def projectVelocity(metric, x, target):
+  """
+  Projects the velocity x[4:8] at coordinates x[0:4] in place back onto the
+  constraint g(v,v) = target of a geodesic, i.e. the mass shell for
+  observers (target 1) or the null cone for photons (target 0). Time-like
+  velocities are rescaled, light-like velocities keep their spatial
+  components and the time component is chosen as the nearest solution of
+  the quadratic constraint. The metric is evaluated using updateCoords.
   """
   metric.updateCoords(x[0:4])
-  result = np.zeros(8, dtype = np.float64)
-  result[0:4] = x[4:8]
-  result[4:8] = -np.einsum('ijk,j,k',metric.getChristoffel(),x[4:8],x[4:8])
-  return result
+  g = metric.getMatrix()
+  v = x[4:8]
+  if target > 0:
+    norm2 = np.dot(v, np.dot(g, v))
+    if norm2 > 0:
+      v *= math.sqrt(target/norm2)
+  else:
+    # g_00*v0^2 + 2*g_0a*v0*v^a + g_ab*v^a*v^b = 0
+    a = g[0,0]
+    b = 2*np.dot(g[0,1:4], v[1:4])
+    c = np.dot(v[1:4], np.dot(g[1:4,1:4], v[1:4]))
+    discriminant = b*b-4*a*c
+    if a != 0 and discriminant >= 0:
+      roots = ((-b+math.sqrt(discriminant))/(2*a), (-b-math.sqrt(discriminant))/(2*a))
+      v[0] = min(roots, key = lambda root: abs(root-v[0]))
+  return x
+
+def _solve(metric, y0, t0, tEnd, times, events, method, rtol, atol, denseOutput, target = None, options = None):
+  """
+  Integrates the geodesic equations like solve_ivp, but steps a SciPy
+  solver manually and counts accepted and rejected steps. If target is not
+  None, the velocity is projected onto the constraint g(v,v) = target after
+  each step, see projectVelocity; samples are projected as well, the dense
+  output interpolates the unprojected steps. Events are located in each step
+  using the step interpolant. Further solver options, e.g. jac or
+  first_step, are given as dictionary options. Returns a dictionary with the
+  same entries as the result of solve_ivp that are used by
+  worldline.geodesic, and the numbers of accepted and rejected steps; the
+  latter is None if the solver does not expose its step attempts.
+  """
+  if options is None:
+    options = {}
+  solver = getattr(spi, method)(lambda t,y: geodesicRHS(t,y,metric), t0, y0, tEnd, rtol = rtol, atol = atol,
+                                **options)
+  # Explicit Runge-Kutta methods estimate the error once per attempted step
+  attempts = None
+  if hasattr(solver, '_estimate_error_norm'):
+    attempts = [0]
+    estimateErrorNorm = solver._estimate_error_norm
+    def countAttempt(*args):
+      attempts[0] += 1
+      return estimateErrorNorm(*args)
+    solver._estimate_error_norm = countAttempt
+
+  # Private metric for projections, so that the solver's metric is not modified
+  projection = metric.copy() if target is not None else None
+  directions = np.array([getattr(event, 'direction', 0) for event in events], dtype = np.float64)
+  values = np.array([event(t0, y0) for event in events], dtype = np.float64)
+
+  ts = [t0]
+  interpolants = []
+  eventTimes = [[] for event in events]
+  eventStates = [[] for event in events]
+  sampleTimes = []
+  samples = []
+  if times is None:
+    sampleTimes.append(t0)
+    samples.append(y0.copy())
+  i = 0
+  steps = 0
+  status = 0
+  message = 'The solver successfully reached the end of the integration interval.'
+
+  while solver.status == 'running':
+    message = solver.step()
+    if solver.status == 'failed':
+      status = -1
+      break
+    steps += 1
+    stepEnd = solver.t
+    # Interpolant of the step, only computed if needed
+    j = i if times is None else np.searchsorted(times, stepEnd, side = 'right')
+    interpolant = solver.dense_output() if denseOutput or len(events) > 0 or j > i else None
+    if target is not None:
+      y = projectVelocity(projection, solver.y.copy(), target)
+      solver.y = y
+      solver.f = solver.fun(solver.t, y)
+    else:
+      y = solver.y
+
+    # Locate sign changes of events in given directions, see solve_ivp
+    if len(events) > 0:
+      newValues = np.array([event(stepEnd, y) for event in events], dtype = np.float64)
+      up = np.logical_and(values <= 0, newValues >= 0)
+      down = np.logical_and(values >= 0, newValues <= 0)
+      crossed = np.logical_or(np.logical_or(np.logical_and(up, directions > 0), np.logical_and(down, directions < 0)),
+                              np.logical_and(np.logical_or(up, down), directions == 0))
+      values = newValues
+      stopTime = None
+      for e in np.flatnonzero(crossed):
+        root = spo.brentq(lambda s: events[e](s, interpolant(s)), solver.t_old, stepEnd, xtol = 4*np.finfo(float).eps)
+        eventTimes[e].append(root)
+        eventStates[e].append(interpolant(root) if target is None else
+                              projectVelocity(projection, interpolant(root), target))
+        if getattr(events[e], 'terminal', False) and (stopTime is None or root < stopTime):
+          stopTime = root
+      if stopTime is not None:
+        # Discard events of the same step after the terminal event
+        for e in range(len(events)):
+          eventStates[e] = [state for t, state in zip(eventTimes[e], eventStates[e]) if t <= stopTime]
+          eventTimes[e] = [t for t in eventTimes[e] if t <= stopTime]
+        stepEnd = stopTime
+        y = interpolant(stepEnd) if target is None else projectVelocity(projection, interpolant(stepEnd), target)
+        j = np.searchsorted(times, stepEnd, side = 'right') if times is not None else i
+        status = 1
+        message = 'A termination event occurred.'
+
+    ts.append(stepEnd)
+    if interpolant is not None:
+      interpolants.append(interpolant)
+    if times is None:
+      sampleTimes.append(stepEnd)
+      samples.append(y.copy())
+    else:
+      if j > i:
+        # Interpolate all samples of the step at once
+        stepSamples = interpolant(times[i:j]).T
+        if target is not None:
+          for sample in stepSamples:
+            projectVelocity(projection, sample, target)
+        if times[j-1] == stepEnd:
+          stepSamples[-1] = y
+        sampleTimes.extend(times[i:j])
+        samples.extend(stepSamples)
+      i = j
+
+    if status == 1:
+      break
+
+  return {"success": status >= 0, "status": status, "message": message,
+          "nfev": solver.nfev, "njev": solver.njev, "nlu": solver.nlu,
+          "t": np.array(sampleTimes, dtype = np.float64),
+          "y": np.array(samples, dtype = np.float64).reshape(-1,8).T,
+          "sol": spi.OdeSolution(ts, interpolants) if denseOutput and len(interpolants) > 0 else None,
+          "t_events": [np.array(t, dtype = np.float64) for t in eventTimes],
+          "y_events": [np.array(y, dtype = np.float64).reshape(-1,8) for y in eventStates],
+          "steps": steps, "rejectedSteps": attempts[0]-steps if attempts is not None else None}
+
+def _advance(solver, times, start = 0):
+  """
+  Generator that advances a SciPy OdeSolver step by step until it finishes
+  or fails, which callers can check using solver.status. Before the first
+  step and after each step, it yields the range of indices [i,j) of the
+  ascending sampling times that have been reached, beginning with index
+  start, together with the states at these times as array of shape
+  (len(y), j-i).
+  """
+  i = start
+  j = max(np.searchsorted(times, solver.t, side = 'right'), i)
+  yield i, j, np.repeat(solver.y[:,np.newaxis], j-i, axis = 1)
+  i = j
+
+  while solver.status == 'running':
+    solver.step()
+    if solver.status == 'failed':
+      return
+    j = np.searchsorted(times, solver.t, side = 'right')
+    if j > i:
+      yield i, j, solver.dense_output()(times[i:j])
+    else:
+      yield i, j, np.empty((solver.y.shape[0],0), dtype = np.float64)
+    i = j
+
+class geodesicEvent:
+  """
+  Terminal event for geodesic integration, see worldline.geodesic. The event
+  fires when function(s, x) of curve parameter s and state x, i.e.
+  coordinates x[0:4] and velocity x[4:8], crosses zero in given direction
+  (positive: from below, negative: from above, 0: either). Events are
+  identified by name on the worldline. Non-terminal events are only
+  recorded by the solver.
+  """
+
+  def __init__(self, function, name, terminal = True, direction = 0):
+    self.function = function
+    self.name = name
+    self.terminal = terminal
+    self.direction = direction
+
+  def __call__(self, s, x):
+    return self.function(s, x)
+
+  def getCacheKey(self):
+    """
+    Returns a tuple that identifies this event across processes, e.g. for
+    persistent caches of results, or None for events with user-defined
+    functions
+    """
+    return None
+
+class horizonEvent(geodesicEvent):
+  """
+  Stops integration when the radius coordinate falls below
+  (1+epsilon)*rSchwarzschild, before the Schwarzschild metric diverges
+  """
+
+  def __init__(self, rSchwarzschild, epsilon = 1.0e-3):
+    assert (rSchwarzschild > 0), "Schwarzschild radius must be > 0"
+    assert (epsilon > 0), "epsilon must be > 0"
+    super(horizonEvent, self).__init__(None, 'horizon', direction = -1)
+    self.radius = (1+epsilon)*rSchwarzschild
+
+  def getCacheKey(self):
+    return (self.name, self.terminal, self.direction, float(self.radius))
+
+  def __call__(self, s, x):
+    return x[1]-self.radius
+
+class escapeEvent(geodesicEvent):
+  """
+  Stops integration when the radius coordinate grows beyond given radius
+  """
+
+  def __init__(self, radius):
+    assert (radius > 0), "Radius must be > 0"
+    super(escapeEvent, self).__init__(None, 'escape', direction = 1)
+    self.radius = radius
+
+  def getCacheKey(self):
+    return (self.name, self.terminal, self.direction, float(self.radius))
+
+  def __call__(self, s, x):
+    return x[1]-self.radius
+
+class polarAxisEvent(geodesicEvent):
+  """
+  Stops integration when the polar angle coordinate comes within epsilon of
+  0 or pi, where spherical coordinates are singular
+  """
+
+  def __init__(self, epsilon = 1.0e-6):
+    assert (epsilon > 0), "epsilon must be > 0"
+    super(polarAxisEvent, self).__init__(None, 'polar axis', direction = -1)
+    self.epsilon = epsilon
+
+  def getCacheKey(self):
+    return (self.name, self.terminal, self.direction, float(self.epsilon))
+
+  def __call__(self, s, x):
+    return min(x[2], np.pi-x[2])-self.epsilon
+
+class worldlineVelocities:
+  """
+  Read-only sequence of the velocity fourvectors along a worldline. The
+  velocities are stored as contiguous (N,4) array, fourvector objects are
+  only created when an element is indexed. These are copies of the start
+  velocity, so that they have the same child class, with the metric
+  evaluated at the corresponding coordinates.
+  """
+
+  def __init__(self, velocity0, coords, vectors):
+    assert (coords.shape == vectors.shape), "Need one coordinate tuple per velocity"
+    self.velocity0 = velocity0
+    self.coords = coords
+    self.vectors = vectors
+
+  def __len__(self):
+    return self.vectors.shape[0]
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return [self[i] for i in range(*index.indices(len(self)))]
+    velocity = copy.copy(self.velocity0)
+    velocity.vector = self.vectors[index].copy()
+    velocity.updateCoords(self.coords[index])
+    return velocity
+
+  def __iter__(self):
+    for i in range(len(self)):
+      yield self[i]
 
 class worldline:
 
@@ -32,14 +341,26 @@ class worldline:
     assert(isinstance(velocity0, fv.fourvector)), "Start velocity must be fourvector type"
     self.velocity0 = velocity0
 
-    # Use plain Python list to store wordlines for convenience, may need to replace this with
-    # NumPy arrays at some point for better performance
-    self.curveparam = []
-    self.coords = []
-    self.velocities = []
+    # Store worldlines as contiguous arrays of proper times, coordinates and velocities
+    self.curveparam = np.empty(0, dtype = np.float64)
+    self.coords = np.empty((0,4), dtype = np.float64)
+    self.velocities = worldlineVelocities(self.velocity0, self.coords, np.empty((0,4), dtype = np.float64))
     self.integralCurve = None
+    # Name and proper time of the terminal event that stopped the integration
+    self.event = None
+    self.eventTime = None
+    # Solver statistics and instrumentation counters of the last integration,
+    # see instrumentation.stats
+    self.stats = None
+    # Solver settings, final proper time, state and step size of the last
+    # integration, see extend
+    self.solverOptions = None
+    self.endTime = None
+    self.endState = None
+    self.lastStep = None
 
-  def geodesic(self, properTime, nSteps = None):
+  def geodesic(self, properTime, nSteps = None, events = None, method = 'RK45', rtol = 1.0e-3, atol = 1.0e-6,
+               denseOutput = True, project = False, cache = None):
     """
     Evolve a coordinate tuple and velocity fourvector along a geodesic using the
     geodesic equations,
@@ -48,19 +369,39 @@ class worldline:
 
     where x' and x'' are first and second derivatives with respect to proper time.
     Argument properTime sets the integration limit, nSteps the number of integration
-    steps that will be stored.
-    """    
-    assert (properTime >= 0), "Proper time must be >= 0"
+    steps that will be stored, solver statistics are stored in the stats attribute,
+    see instrumentation. Integration stops early if one of the terminal
+    events in list events fires, e.g. horizonEvent, see geodesicEvent; samples
+    are then only stored up to the event.
 
-    # Reset any previous computation
-    self.curveparam.clear()
-    self.coords.clear()
-    self.velocities.clear()
+    Argument method selects one of the SciPy solvers RK23, RK45, DOP853, Radau,
+    BDF or LSODA with relative and absolute tolerances rtol and atol. Implicit
+    solvers (Radau, BDF, LSODA) use the analytic Jacobian of the metric if
+    available, see metric.geodesicJacobian, which helps in stiff regimes close
+    to the horizon. The continuous solution is only kept if denseOutput is
+    True, which is required by acceleration and accelerations.
 
-    if properTime == 0:
-      self.curveparam.append(0)
-      self.coords.append(self.coord0)
-      self.velocities.append(self.velocity0)
+    If project is True, the velocity is projected back onto the constraint
+    g(v,v) = 1 for observers or g(v,v) = 0 for photons after each step, see
+    projectVelocity, which keeps the constraint drift at round-off level even
+    at loose tolerances. This mode requires an explicit Runge-Kutta method.
+
+    If a geodesicCache is given as cache, see module cache, results are looked
+    up by a hash of the initial state, metric parameters, events and solver
+    settings, and integration is skipped entirely on a hit; new results are
+    stored. The dense output is not cached, so that denseOutput must be
+    False. Results with metrics or events that cannot be identified across
+    processes, see metric.getCacheKey, are not cached.
+    """    
+    assert (properTime >= 0), "Proper time must be >= 0"
+    assert (method in explicitMethods+implicitMethods), "Unknown integration method"
+    assert (rtol > 0 and atol > 0), "Tolerances must be > 0"
+    if events is None:
+      events = []
+    assert (all(callable(event) for event in events)), "Events must be callable"
+    if project:
+      assert (method in explicitMethods), "Projection requires an explicit Runge-Kutta method"
+      assert (isinstance(self.velocity0, (fv.observer, fv.photon))), "Projection requires observer or photon velocity"
 
     if nSteps is not None:
       assert (nSteps > 0), "nSteps must be 1 or larger"
@@ -68,27 +409,413 @@ class worldline:
     else:
       times = None
 
+    # Keep solver settings for extend
+    self.solverOptions = {'method': method, 'rtol': rtol, 'atol': atol, 'denseOutput': denseOutput,
+                          'project': project}
+
+    # Without integration interval, the worldline consists of the start point
+    if properTime == 0:
+      self.integralCurve = None
+      self.curveparam = np.zeros(1, dtype = np.float64)
+      self.coords = self.coord0.reshape(1,4).copy()
+      self.velocities = worldlineVelocities(self.velocity0, self.coords, self.velocity0.vector.reshape(1,4).copy())
+      self.event = None
+      self.eventTime = None
+      self.endTime = 0.0
+      self.endState = np.concatenate((self.coord0, self.velocity0.vector))
+      self.lastStep = None
+      self.stats = ins.stats()
+      return
+
+    # Reuse cached results if possible
+    key = None
+    if cache is not None:
+      assert (not denseOutput), "Cached results have no dense output, use denseOutput = False"
+      key = ch.geodesicKey(self.coord0, self.velocity0, properTime, nSteps, events, self.solverOptions)
+      if key is not None:
+        data = cache.load(key)
+        if data is not None:
+          ins.count('cache.hits')
+          self._restore(data)
+          return
+        ins.count('cache.misses')
+
     # Set up vector with initial values
     y0 = np.concatenate((self.coord0, self.velocity0.vector))
+    result = self._integrate(0, y0, properTime, times, events)
+
+    # Store integration results - OdeSolution object, proper time, coords, velocities,
+    # replacing any previous computation
+    self.integralCurve = result["sol"]
+    self.curveparam = result["t"]
+    self.coords = np.ascontiguousarray(result["y"][0:4].T)
+    self.velocities = worldlineVelocities(self.velocity0, self.coords, np.ascontiguousarray(result["y"][4:8].T))
+
+    if key is not None:
+      cache.store(key, self._cacheArrays())
+
+  def _cacheArrays(self):
+    """
+    Returns the results of an integration without dense output as dictionary
+    of arrays for geodesicCache, missing values are stored as NaN
+    """
+    names = sorted(self.stats.counters)
+    return {'curveparam': self.curveparam, 'coords': self.coords, 'vectors': self.velocities.vectors,
+            'event': np.array('' if self.event is None else self.event),
+            'eventTime': np.array(np.nan if self.eventTime is None else self.eventTime),
+            'endTime': np.array(self.endTime),
+            'endState': np.full(8, np.nan) if self.endState is None else self.endState,
+            'lastStep': np.array(np.nan if self.lastStep is None else self.lastStep),
+            'statsNames': np.array(names, dtype = str),
+            'statsValues': np.array([self.stats.counters[name] for name in names], dtype = np.int64)}
+
+  def _restore(self, data):
+    """
+    Restores the results of an integration from a dictionary of arrays, see
+    _cacheArrays
+    """
+    self.integralCurve = None
+    self.curveparam = data['curveparam']
+    self.coords = np.ascontiguousarray(data['coords'])
+    self.velocities = worldlineVelocities(self.velocity0, self.coords, np.ascontiguousarray(data['vectors']))
+    self.event = str(data['event']) if str(data['event']) else None
+    self.eventTime = None if np.isnan(data['eventTime']) else float(data['eventTime'])
+    self.endTime = float(data['endTime'])
+    self.endState = None if np.any(np.isnan(data['endState'])) else data['endState'].copy()
+    self.lastStep = None if np.isnan(data['lastStep']) else float(data['lastStep'])
+    counters = {str(name): int(value) for name, value in zip(data['statsNames'], data['statsValues'])}
+    counters['cache.hits'] = 1
+    self.stats = ins.stats(counters)
+
+  def extend(self, properTime, nSteps = None, events = None, reuseStep = True):
+    """
+    Continues the integration of a geodesic from the end of the worldline,
+    i.e. the final proper time of the last integration or the time of the
+    terminal event that stopped it, for given additional proper time with
+    the solver settings of geodesic. Argument nSteps sets the number of
+    equidistant samples after the previous end, which are appended to the
+    stored samples; without nSteps, all solver steps are appended. Dense
+    output segments are appended to the integral curve, solver statistics
+    are accumulated. If reuseStep is True, the first step size is the last
+    accepted step size of the previous integration where known, so that the
+    solver does not need to find it again. Terminal events work as in
+    geodesic and replace the previous event.
+    """
+    assert (properTime > 0), "Proper time must be > 0"
+    assert (self.endState is not None), "Worldline must have been integrated, see geodesic"
+    if nSteps is not None:
+      assert (nSteps > 0), "nSteps must be 1 or larger"
+      times = np.linspace(self.endTime, self.endTime+properTime, nSteps+1)[1:]
+    else:
+      times = None
+    if events is None:
+      events = []
+    assert (all(callable(event) for event in events)), "Events must be callable"
+
+    firstStep = None
+    if reuseStep and self.lastStep is not None:
+      firstStep = min(self.lastStep, properTime)
+    previousCurve = self.integralCurve
+    previousStats = self.stats
+    previousEnd = self.endTime
+    result = self._integrate(self.endTime, self.endState, self.endTime+properTime, times, events, firstStep)
+
+    # Append new samples, the start sample without sampling times is the
+    # previous end
+    t = result["t"]
+    y = result["y"]
+    if times is None:
+      t = t[1:]
+      y = y[:,1:]
+    self.curveparam = np.concatenate((self.curveparam, t))
+    self.coords = np.ascontiguousarray(np.concatenate((self.coords, y[0:4].T)))
+    vectors = np.ascontiguousarray(np.concatenate((self.velocities.vectors, y[4:8].T)))
+    self.velocities = worldlineVelocities(self.velocity0, self.coords, vectors)
+
+    # Append dense output segments
+    if previousCurve is not None and result["sol"] is not None:
+      self.integralCurve = spi.OdeSolution(np.concatenate((previousCurve.ts, result["sol"].ts[1:])),
+                                           previousCurve.interpolants + result["sol"].interpolants)
+    elif previousEnd == 0:
+      # Worldline consisted of the start point only
+      self.integralCurve = result["sol"]
+    else:
+      self.integralCurve = None
+    self.stats = previousStats.update(self.stats)
+
+  def resample(self, times, coordinateTime = False, metrics = False):
+    """
+    Evaluates the worldline at an array of N proper times with one call of
+    the dense output, or at N coordinate times t if coordinateTime is True.
+    Coordinate times are converted to proper times by inverting t(tau) with
+    Newton iterations, starting from linear interpolation between the solver
+    steps; this requires that t increases along the worldline. Returns a
+    tuple of proper times, coordinates and velocities as arrays of shape
+    (N,), (N,4) and (N,4). If metrics is True, matrix elements and
+    Christoffel symbols at each location are appended as arrays of shape
+    (N,4,4) and (N,4,4,4), see metric.evaluateBatch.
+    """
+    assert (self.integralCurve is not None), "Worldline must have dense output, see geodesic"
+    times = np.atleast_1d(np.asarray(times, dtype = np.float64))
+    assert (times.ndim == 1), "Times must be a scalar or 1D array"
+    ts = self.integralCurve.ts
+    tauStart = min(ts[0], ts[-1])
+    tauEnd = max(ts[0], ts[-1])
+
+    if coordinateTime:
+      # Coordinate time at solver steps for the initial guess
+      stepTimes = self.integralCurve(ts)[0]
+      assert (np.all(np.diff(stepTimes) > 0)), "Coordinate time must increase along worldline"
+      assert (np.all(times >= stepTimes[0]) and np.all(times <= stepTimes[-1])), "Coordinate time outside of worldline"
+      properTimes = np.interp(times, stepTimes, ts)
+      # Newton iterations with dt/dtau = v^0
+      tolerance = 4*np.finfo(np.float64).eps*max(np.max(np.abs(stepTimes)), 1.0)
+      for iteration in range(50):
+        states = self.integralCurve(properTimes)
+        residuals = states[0]-times
+        if np.max(np.abs(residuals), initial = 0) <= tolerance:
+          break
+        properTimes = np.clip(properTimes-residuals/states[4], tauStart, tauEnd)
+    else:
+      assert (np.all(times >= tauStart) and np.all(times <= tauEnd)), "Proper time outside of worldline"
+      properTimes = times
+      states = self.integralCurve(properTimes)
 
-    result = spi.solve_ivp(lambda t,y: geodesicRHS(t,y,self.velocity0.metric), [0, properTime],
-                           y0, method = 'RK45', t_eval = times, dense_output = True)
+    coords = np.ascontiguousarray(states[0:4].T)
+    velocities = np.ascontiguousarray(states[4:8].T)
+    if not metrics:
+      return properTimes, coords, velocities
+    matrices, christoffels = self.velocity0.getMetric().evaluateBatch(coords)
+    return properTimes, coords, velocities, matrices, christoffels
+
+  def _integrate(self, t0, y0, tEnd, times, events, firstStep = None):
+    """
+    Integrates the geodesic equations from state y0 at proper time t0 to
+    tEnd with the solver settings of geodesic, see geodesic for the other
+    arguments. Records the terminal event, solver statistics and the final
+    state and step size, and returns the result of _solve.
+    """
+    method = self.solverOptions['method']
+    rtol = self.solverOptions['rtol']
+    atol = self.solverOptions['atol']
+    denseOutput = self.solverOptions['denseOutput']
+    project = self.solverOptions['project']
+
+    # Record hot-path counters and timers if instrumentation is enabled
+    start = ins.current() if ins.enabled else None
+
+    # Private metric for the solver, generic metrics are modified when the
+    # geodesic equations are evaluated, see metric.geodesicAcceleration
+    metric = self.velocity0.getMetric().copy()
+    options = _solverOptions(metric, method, y0)
+    if firstStep is not None:
+      options['first_step'] = firstStep
+
+    target = None
+    if project:
+      target = 1.0 if isinstance(self.velocity0, fv.observer) else 0.0
+    result = _solve(metric, y0, t0, tEnd, times, events, method, rtol, atol, denseOutput, target, options)
 
     # Let user know if things went wrong, but keep output nonetheless
     if not result["success"]:
       print(result)
+    # Record the terminal event that stopped the integration, if any
+    self.event = None
+    self.eventTime = None
+    endState = None
+    if result["status"] == 1:
+      for event, eventTimes, eventStates in zip(events, result["t_events"], result["y_events"]):
+        if getattr(event, 'terminal', False) and len(eventTimes) > 0:
+          self.event = getattr(event, 'name', getattr(event, '__name__', None))
+          self.eventTime = eventTimes[-1]
+          endState = eventStates[-1]
 
-    # Store integration results - OdeSolution object, proper time, coords, velocities
-    self.integralCurve = result["sol"]
-    for i in range(len(result["t"])):
-      self.curveparam.append(result["t"][i])
-      coord = result["y"][0:4,i]
-      self.coords.append(coord)
-      # Use deep copy here so that we get the correct child class
-      self.velocities.append(copy.deepcopy(self.velocity0))
-      self.velocities[-1].vector = result["y"][4:8,i]
-      # Each velocity vector has its own copy of the metric, evaluated at coord
-      self.velocities[-1].metric.updateCoords(coord)
+    # Final state and last accepted step size, from which extend continues;
+    # stored samples are preferred as they may have been projected
+    sol = result["sol"]
+    if self.event is not None:
+      self.endTime = self.eventTime
+    elif result["status"] == 0:
+      self.endTime = tEnd
+    elif sol is not None:
+      self.endTime = sol.ts[-1]
+    else:
+      self.endTime = result["t"][-1] if len(result["t"]) > 0 else t0
+    if len(result["t"]) > 0 and result["t"][-1] == self.endTime:
+      endState = result["y"][:,-1]
+    elif endState is None and sol is not None:
+      endState = sol(self.endTime)
+    self.endState = None if endState is None else np.array(endState, dtype = np.float64)
+    self.lastStep = None
+    if sol is not None and len(sol.ts) > 1:
+      self.lastStep = sol.ts[-1]-sol.ts[-2]
+    elif times is None and len(result["t"]) > 1:
+      self.lastStep = result["t"][-1]-result["t"][-2]
+
+    # Solver statistics, rejected steps are only known for solvers that
+    # expose their step attempts, see _solve
+    self.stats = ins.stats({'solver.nfev': result["nfev"], 'solver.njev': result["njev"],
+                            'solver.nlu': result["nlu"], 'solver.steps': result["steps"]})
+    if result["rejectedSteps"] is not None:
+      self.stats.counters['solver.rejectedSteps'] = result["rejectedSteps"]
+    if start is not None:
+      hotPaths = ins.current()-start
+      # Make solver statistics available to instrumentation.collect
+      for name, value in self.stats.counters.items():
+        ins.count(name, value)
+      self.stats.update(hotPaths)
+    return result
+
+  def diagnostics(self):
+    """
+    Returns a dictionary of arrays with diagnostics for each sample of a
+    geodesic: the drift of the constraint g(v,v) from its start value (1 for
+    observers, 0 for photons) as 'constraintDrift', and the quantities that
+    are conserved along geodesics of the metric, see
+    metric.conservedQuantities, e.g. 'energy' and 'angularMomentum'.
+    """
+    metric = self.velocity0.getMetric()
+    vectors = self.velocities.vectors
+    matrices, christoffels = metric.evaluateBatch(self.coords)
+    norms = np.einsum('ni,nij,nj->n', vectors, matrices, vectors)
+    if isinstance(self.velocity0, fv.observer):
+      target = 1.0
+    elif isinstance(self.velocity0, fv.photon):
+      target = 0.0
+    else:
+      target = self.velocity0.innerProduct()
+    result = {'constraintDrift': norms-target}
+    result.update(metric.conservedQuantities(self.coords, vectors))
+    return result
+
+  def geodesicChunks(self, properTime, nSteps, chunkSize = 4096, method = 'RK45', rtol = 1.0e-3, atol = 1.0e-6):
+    """
+    Generator that evolves the start coordinates and velocity along a geodesic,
+    see geodesic, and yields the nSteps equidistant samples in chunks of up to
+    chunkSize samples as tuples (tau, x, v) of arrays with shapes (m,), (m,4)
+    and (m,4). Neither the samples nor the dense output are kept, so that
+    memory usage does not depend on the number of samples. Arguments method,
+    rtol and atol select the solver and its tolerances, see geodesic.
+    """
+    assert (properTime >= 0), "Proper time must be >= 0"
+    assert (nSteps > 0), "nSteps must be 1 or larger"
+    assert (chunkSize > 0), "chunkSize must be 1 or larger"
+    assert (rtol > 0 and atol > 0), "Tolerances must be > 0"
+
+    # Sampling times are computed on the fly as in np.linspace
+    dtau = properTime/(nSteps-1) if nSteps > 1 else 0.0
+    def sampleTimes(start, stop):
+      indices = np.arange(start, stop)
+      times = indices*dtau
+      if nSteps > 1:
+        times[indices == nSteps-1] = properTime
+      return times
+
+    def samplesReached(t):
+      # Number of sampling times <= t
+      if dtau == 0:
+        return nSteps
+      count = min(nSteps, int(t/dtau)+2)
+      while count > 0 and sampleTimes(count-1, count)[0] > t:
+        count -= 1
+      return count
+
+    # Private metric for the solver, see _integrate
+    metric = self.velocity0.getMetric().copy()
+    y0 = np.concatenate((self.coord0, self.velocity0.vector))
+    options = _solverOptions(metric, method, y0)
+    solver = getattr(spi, method)(lambda t,y: geodesicRHS(t,y,metric), 0, y0, properTime,
+                                  rtol = rtol, atol = atol, **options)
+
+    tau = np.empty(chunkSize, dtype = np.float64)
+    states = np.empty((chunkSize,8), dtype = np.float64)
+    fill = 0
+    start = 0
+    while start < nSteps:
+      # A single step can cover many samples, these are interpolated at most
+      # one chunk at a time to keep memory usage bounded
+      reached = samplesReached(solver.t)
+      interpolant = solver.dense_output() if solver.t_old is not None and reached > start else None
+      while start < reached:
+        m = min(chunkSize-fill, reached-start)
+        times = sampleTimes(start, start+m)
+        tau[fill:fill+m] = times
+        states[fill:fill+m] = interpolant(times).T if interpolant is not None else y0
+        fill += m
+        start += m
+        if fill == chunkSize:
+          yield tau.copy(), states[:,0:4].copy(), states[:,4:8].copy()
+          fill = 0
+
+      if solver.status != 'running':
+        break
+      message = solver.step()
+      # Let user know if things went wrong, but keep output nonetheless
+      if solver.status == 'failed':
+        print(message)
+        break
+
+    if fill > 0:
+      yield tau[0:fill].copy(), states[0:fill,0:4].copy(), states[0:fill,4:8].copy()
+
+  def geodesicToFile(self, filename, properTime, nSteps, chunkSize = 4096, **options):
+    """
+    Evolves the start coordinates and velocity along a geodesic, see
+    geodesicChunks, and writes the nSteps samples directly into a
+    memory-mapped .npy file as array of shape (nSteps,9) with columns
+    (tau, x^0..x^3, v^0..v^3). Samples that could not be computed are NaN.
+    Solver options are passed to geodesicChunks. Returns the memory-mapped
+    array.
+    """
+    output = np.lib.format.open_memmap(filename, mode = 'w+', dtype = np.float64, shape = (nSteps,9))
+    start = 0
+    for tau, x, v in self.geodesicChunks(properTime, nSteps, chunkSize, **options):
+      output[start:start+tau.size,0] = tau
+      output[start:start+tau.size,1:5] = x
+      output[start:start+tau.size,5:9] = v
+      start += tau.size
+      # Write chunk to disk so that its pages can be released
+      output.flush()
+    output[start:] = np.nan
+    output.flush()
+    return output
+
+  def accelerations(self, properTimes):
+    """
+    Computes acceleration along a worldline at an array of N proper times,
+    see acceleration, and returns the contravariant components as (N,4)
+    array. The dense output of the worldline is evaluated once for all
+    stencil points, and Christoffel symbols are evaluated as one batch.
+    """
+    properTimes = np.atleast_1d(np.asarray(properTimes, dtype = np.float64))
+    assert (properTimes.ndim == 1), "Proper times must be a scalar or 1D array"
+    assert (np.all(properTimes >= 0)), "Proper time must be >= 0"
+    assert (self.integralCurve is not None), "Worldline must have dense output, see geodesic"
+
+    # Get proper time at the end of worldline
+    totalTime = self.curveparam[-1]
+    assert (np.all(properTimes <= totalTime)), "Proper time larger than end time of worldline"
+
+    # Compute directional derivative along curve around given proper times using a
+    # +- 5% stencil, two-sided if possible
+    dtau = 0.05 * totalTime
+    upper = np.where(properTimes <= (totalTime-dtau), properTimes+dtau, properTimes)
+    lower = np.where(properTimes >= dtau, properTimes-dtau, properTimes)
+
+    # Evaluate coordinates and velocities at all proper times and stencil points
+    # in one call
+    nTimes = properTimes.shape[0]
+    samples = self.integralCurve(np.concatenate((properTimes, upper, lower)))
+    coords = samples[0:4,0:nTimes].T
+    vels = samples[4:8,0:nTimes].T
+    dvdtau = ((samples[4:8,nTimes:2*nTimes]-samples[4:8,2*nTimes:])/(upper-lower)).T
+
+    # Compute basis corrections for directional derivatives using Christoffel symbols
+    metric = self.velocity0.getMetric()
+    matrices, christoffels = metric.evaluateBatch(coords)
+    corr = metric.contractChristoffelBatch(christoffels, vels)
+
+    return dvdtau + corr
 
   def acceleration(self, properTime):
     """
@@ -99,38 +826,200 @@ class worldline:
     where gamma are the Christoffel symbols.
     """
     assert (properTime >= 0), "Proper time must be >= 0"
-    assert (self.integralCurve is not None), "Worldline must have at least two points"
+    assert (self.integralCurve is not None), "Worldline must have dense output, see geodesic"
 
-    # Get proper time at the end of worldline
-    totalTime = self.curveparam[-1]
-    assert (properTime <= totalTime), "Proper time larger than end time of worldline"
+    # Evaluate a copy of the worldline metric at the given location
+    metric = self.velocity0.getMetric().copy()
+    metric.updateCoords(self.integralCurve(properTime)[0:4])
 
-    # Compute directional derivative along curve around given proper time using a
-    # +- 5% stencil
-    dtau = 0.05 * totalTime
-    # Use two-sided stencil if possible
-    if properTime >= dtau and properTime <= (totalTime-dtau):
-      dvdtau = (self.integralCurve(properTime+dtau)[4:8]-self.integralCurve(properTime-dtau)[4:8])/(2*dtau)
-    elif properTime > (totalTime-dtau):
-      dvdtau = (self.integralCurve(properTime)[4:8]-self.integralCurve(properTime-dtau)[4:8])/dtau
-    elif properTime < dtau:
-      dvdtau = (self.integralCurve(properTime+dtau)[4:8]-self.integralCurve(properTime)[4:8])/dtau
-    else:
-      print ("ERROR: This branch should never be reached")
-      return None
+    # The new four-vector shares the frozen metric
+    return fv.fourvector(self.accelerations(properTime)[0], metric.freeze())
 
-    # Get coordinates and velocities at given proper time
-    coord = self.integralCurve(properTime)[0:4]
-    vel = self.integralCurve(properTime)[4:8]
+class worldlineEnsemble:
+  """
+  Ensemble of N worldlines in a common metric that are integrated together in
+  one vectorised solve, e.g. for test particles or photons in the same
+  Schwarzschild background.
+  """
 
-    # Create new four-vector with the same metric as the worldline
-    result = fv.fourvector([0,0,0,0], self.velocity0.metric)
-    result.metric.updateCoords(coord)
+  def __init__(self, coords0, velocities0):
+    self.coords0 = np.array(coords0, dtype = np.float64)
+    assert (self.coords0.ndim == 2 and self.coords0.shape[1] == 4), "Start coordinates must have shape (N,4)"
+    assert (isinstance(velocities0, fv.fourvectorBatch)), "Start velocities must be fourvectorBatch type"
+    assert (len(velocities0) == self.coords0.shape[0]), "Need one start velocity per start coordinate tuple"
+    self.velocities0 = velocities0
 
-    # Compute basis correction for directional derivative using Christoffel symbols
-    corr = np.einsum('i,j,kij', vel, vel, result.metric.getChristoffel())
+    # Proper times, states with shape (N, nSteps, 8) and proper time at which
+    # each worldline was stopped (infinite if integrated to the end)
+    self.curveparam = None
+    self.states = None
+    self.stopTimes = None
 
-    # Combine directional derivative and basis correction to obtain covariant derivative
-    result.vector = dvdtau + corr
+  def getCoords(self):
+    return self.states[:,:,0:4]
 
-    return result
+  def getVelocities(self):
+    return self.states[:,:,4:8]
+
+  def geodesic(self, properTime, nSteps, method = 'RK45', rtol = 1.0e-3, atol = 1.0e-6, stopCondition = None):
+    """
+    Evolve all coordinate tuples and velocities along geodesics, see
+    worldline.geodesic, and store nSteps equidistant samples of each worldline.
+
+    The solver controls the step size using the root mean square error of
+    all worldlines, to which stopped worldlines keep contributing zeros. The
+    tolerances are divided by the square root of the number of worldlines, so
+    that each of them is integrated at least as accurately as by itself. Worldlines are stopped after the step in which their
+    coordinates or velocities become non-finite, or stopCondition returns
+    True; stopCondition takes (N,4) arrays of coordinates and velocities and
+    returns an array of N booleans. Stopped worldlines are frozen so that
+    they no longer restrict the step size, their samples after the stop time
+    are set to NaN. Argument method selects one of the explicit Runge-Kutta
+    solvers RK23, RK45 or DOP853.
+    """
+    assert (properTime >= 0), "Proper time must be >= 0"
+    assert (nSteps > 0), "nSteps must be 1 or larger"
+    assert (method in explicitMethods), "Method must be an explicit Runge-Kutta method"
+
+    nLines = self.coords0.shape[0]
+    metric = self.velocities0.getMetric()
+    self.curveparam = np.linspace(0, properTime, nSteps)
+    self.states = np.full((nLines, nSteps, 8), np.nan, dtype = np.float64)
+    self.stopTimes = np.full(nLines, np.inf, dtype = np.float64)
+    active = np.ones(nLines, dtype = bool)
+    # Worldlines with non-finite derivatives during the current step
+    diverged = np.zeros(nLines, dtype = bool)
+
+    def rhs(s, y):
+      states = y.reshape(nLines, 8)
+      result = np.zeros((nLines, 8), dtype = np.float64)
+      result[active,0:4] = states[active,4:8]
+      result[active,4:8] = metric.geodesicAccelerationBatch(states[active,0:4], states[active,4:8])
+      # Flag and freeze worldlines that diverge, so that they cannot spoil the
+      # error estimate of the step
+      invalid = np.logical_not(np.all(np.isfinite(result), axis = 1))
+      diverged[invalid] = True
+      result[invalid] = 0
+      return result.ravel()
+
+    def stopLines(stop, stopTime):
+      self.stopTimes[stop] = stopTime
+      self.states[stop] = np.where(self.curveparam[np.newaxis,:,np.newaxis] > stopTime[:,np.newaxis,np.newaxis],
+                                   np.nan, self.states[stop])
+      active[stop] = False
+
+    # Constant, so that stopping worldlines does not loosen the tolerances of
+    # the remaining ones
+    scale = np.sqrt(nLines)
+    t = 0
+    y = np.concatenate((self.coords0, self.velocities0.vectors), axis = 1).ravel()
+    start = 0
+    with np.errstate(all = 'ignore'):
+      while np.any(active):
+        solver = getattr(spi, method)(rhs, t, y, properTime,
+                                      rtol = rtol/scale, atol = atol/scale)
+        for i, j, samples in _advance(solver, self.curveparam, start):
+          # Samples are stored for all worldlines that were active during the step
+          self.states[active,i:j,:] = samples.reshape(nLines, 8, j-i)[active].transpose(0,2,1)
+          start = j
+
+          states = solver.y.reshape(nLines, 8)
+          stop = np.logical_or(diverged, np.logical_not(np.all(np.isfinite(states), axis = 1)))
+          if stopCondition is not None:
+            stop = np.logical_or(stop, stopCondition(states[:,0:4], states[:,4:8]))
+          stop = np.logical_and(stop, active)
+          if np.any(stop):
+            # Diverged worldlines are only valid up to the start of the step
+            stopLines(stop, np.where(diverged[stop], solver.t_old if solver.t_old is not None else t, solver.t))
+            # Reset frozen states and their derivatives, which the solver
+            # reuses in the next step
+            states[stop] = 0
+            solver.f = solver.fun(solver.t, solver.y)
+          diverged[:] = False
+
+          if not np.any(active):
+            break
+
+        if solver.status != 'failed':
+          break
+
+        # The step size became too small, most likely because a worldline
+        # approaches a singularity. Stop the active worldline with the largest
+        # relative rate of change and restart the solver without it.
+        t = solver.t
+        y = solver.y.copy()
+        states = y.reshape(nLines, 8)
+        rates = np.linalg.norm(rhs(t, y).reshape(nLines, 8), axis = 1)/(np.linalg.norm(states, axis = 1) + 1.0e-300)
+        rates[np.logical_not(active)] = -np.inf
+        rates[diverged] = np.inf
+        stop = np.zeros(nLines, dtype = bool)
+        stop[np.argmax(rates)] = True
+        stopLines(stop, np.array([t]))
+        states[stop] = 0
+        diverged[:] = False
+
+# -----------------------------------------------------------------------
+
+def _geodesicChunk(coords0, velocities0, properTime, nSteps, events, options):
+  """
+  Computes geodesic worldlines for a chunk of a parameter sweep, see
+  iterGeodesicSweep; runs in a worker process.
+  """
+  paths = []
+  for coord0, velocity0 in zip(coords0, velocities0):
+    path = worldline(coord0, velocity0)
+    path.geodesic(properTime, nSteps, events, **options)
+    paths.append(path)
+  return paths
+
+def iterGeodesicSweep(coords0, velocities0, properTime, nSteps = None, maxWorkers = None, chunkSize = None,
+                      events = None, **options):
+  """
+  Generator that computes geodesic worldlines for a sweep over start
+  coordinate tuples and start velocity fourvectors, see worldline.geodesic.
+  The initial conditions are split into chunks of chunkSize elements, which
+  are distributed across a pool of maxWorkers processes (default: number of
+  CPU cores). Each chunk is yielded as soon as it completes as a tuple of the
+  index of its first initial condition and a list of worldlines, so that the
+  chunks arrive in completion order rather than input order. Terminal events
+  are passed to worldline.geodesic and must be picklable, e.g. instances of
+  geodesicEvent with module-level functions. Further keyword arguments are
+  passed to worldline.geodesic as solver options, e.g. method, rtol, atol,
+  denseOutput (False avoids sending dense output back from the workers),
+  project or cache.
+  """
+  assert (len(coords0) == len(velocities0)), "Need one start velocity per start coordinate tuple"
+  assert (maxWorkers is None or maxWorkers > 0), "maxWorkers must be 1 or larger"
+  assert (chunkSize is None or chunkSize > 0), "chunkSize must be 1 or larger"
+
+  if maxWorkers is None:
+    maxWorkers = os.cpu_count() or 1
+  if chunkSize is None:
+    # Use several chunks per worker to balance the load
+    chunkSize = max(1, len(coords0)//(4*maxWorkers))
+
+  executor = cf.ProcessPoolExecutor(max_workers = maxWorkers)
+  try:
+    futures = {}
+    for start in range(0, len(coords0), chunkSize):
+      future = executor.submit(_geodesicChunk, coords0[start:start+chunkSize],
+                               velocities0[start:start+chunkSize], properTime, nSteps, events, options)
+      futures[future] = start
+    for future in cf.as_completed(futures):
+      yield futures[future], future.result()
+  finally:
+    # Do not compute remaining chunks if the caller stops early
+    executor.shutdown(cancel_futures = True)
+
+def geodesicSweep(coords0, velocities0, properTime, nSteps = None, maxWorkers = None, chunkSize = None,
+                  events = None, **options):
+  """
+  Computes geodesic worldlines for a sweep over start coordinate tuples and
+  start velocity fourvectors in parallel with given solver options, see
+  iterGeodesicSweep, and returns them as a list in input order.
+  """
+  paths = [None]*len(coords0)
+  for start, chunk in iterGeodesicSweep(coords0, velocities0, properTime, nSteps, maxWorkers, chunkSize, events,
+                                        **options):
+    paths[start:start+len(chunk)] = chunk
+  return paths
@@ -1,7 +1,10 @@
 import numpy as np
+import tracemalloc
+import pytest
 import worldline as wl
 import fourvector as fv
 import metric as mt
+from orbits import circularOrbit, radialInfall
 
 def test_geodesic():
 
@@ -105,3 +108,383 @@ def test_geodesic():
     # The resting observers must all measure the same orbital energy
     orbEnergy = mass*np.sqrt(1+r0*r0*vphi0*vphi0)
     assert (np.isclose(vel.energy(obs), orbEnergy)), "Unexpected orbital energy"
+
+  # Batched accelerations must agree with single evaluations, including the
+  # one-sided stencils at both ends of the worldline
+  properTimes = np.linspace(0, 100, 41)
+  accelerations = path.accelerations(properTimes)
+  assert (accelerations.shape == (41,4)), "Unexpected shape of accelerations"
+  assert (np.allclose(accelerations, np.zeros((41,4)))), "Four-acceleration should vanish"
+  for i in [0, 1, 20, 40]:
+    assert (np.allclose(accelerations[i], path.acceleration(properTimes[i]).vector, rtol = 0, atol = 1.0e-14)), "Unexpected acceleration"
+
+def test_worldlineEnsemble():
+
+  # Particles in stable circular orbits at different radii, see test_geodesic
+  rs = 1.0
+  r0 = np.array([20, 50, 80], dtype = np.float64)
+  theta0 = 0.5*np.pi
+  vphi0 = np.sqrt(rs/(2*r0*r0*(r0-3*rs/2)))
+  vt0 = np.sqrt((1+r0*r0*vphi0*vphi0)/(1-rs/r0))
+  coords0 = np.zeros((3,4))
+  coords0[:,1] = r0
+  coords0[:,2] = theta0
+  velocities0 = np.zeros((3,4))
+  velocities0[:,0] = vt0
+  velocities0[:,3] = vphi0
+  metric = mt.schwarzschild(rs, r0[0], theta0)
+  ensemble = wl.worldlineEnsemble(coords0, fv.fourvectorBatch(velocities0, metric))
+  nSteps = 20
+  ensemble.geodesic(100, nSteps)
+  assert (ensemble.states.shape == (3,nSteps,8)), "Unexpected shape of ensemble states"
+  assert (np.all(np.isinf(ensemble.stopTimes))), "No worldline should be stopped"
+  tau = ensemble.curveparam
+  coords = ensemble.getCoords()
+  velocities = ensemble.getVelocities()
+  for i in range(3):
+    assert (np.allclose(coords[i,:,0], tau*vt0[i])), "Expected constant time coordinate velocity"
+    assert (np.allclose(coords[i,:,1], r0[i])), "Expected constant radius coordinate"
+    assert (np.allclose(coords[i,:,2], theta0)), "Expected constant polar angle coordinate"
+    assert (np.allclose(coords[i,:,3], tau*vphi0[i])), "Expected constant orbital coordinate velocity"
+    assert (np.allclose(velocities[i], velocities0[i])), "Expected constant velocity"
+
+  # Results must agree with individual worldlines
+  for i in range(3):
+    path = wl.worldline(coords0[i], fv.particle(velocities0[i], mt.schwarzschild(rs, r0[i], theta0), 1))
+    path.geodesic(100, nSteps)
+    assert (np.allclose(coords[i], np.array(path.coords))), "Ensemble and individual worldline differ"
+
+  # Radial infall from rest next to a circular orbit - falling particle is stopped
+  # by stop condition, orbiting particle is unaffected
+  coords0 = np.array([[0,5*rs,theta0,0],[0,r0[1],theta0,0]], dtype = np.float64)
+  velocities0 = np.array([[1/np.sqrt(1-rs/(5*rs)),0,0,0],[vt0[1],0,0,vphi0[1]]], dtype = np.float64)
+  ensemble = wl.worldlineEnsemble(coords0, fv.fourvectorBatch(velocities0, metric))
+  ensemble.geodesic(100, nSteps, stopCondition = lambda x,v: x[:,1] < 1.5*rs)
+  assert (ensemble.stopTimes[0] < 100 and np.isinf(ensemble.stopTimes[1])), "Expected falling particle to stop"
+  stopped = ensemble.curveparam > ensemble.stopTimes[0]
+  assert (np.all(np.isnan(ensemble.states[0,stopped]))), "Expected NaN samples after stop time"
+  assert (np.all(ensemble.getCoords()[0,np.logical_not(stopped),1] > 1.5*rs)), "Unexpected radius before stop time"
+  assert (np.allclose(ensemble.getCoords()[1,:,1], r0[1])), "Expected constant radius coordinate"
+
+  # Without stop condition, the falling particle must not hold back the orbiting one
+  ensemble.geodesic(100, nSteps)
+  assert (ensemble.stopTimes[0] < 100 and np.isinf(ensemble.stopTimes[1])), "Expected falling particle to stop"
+  assert (np.allclose(ensemble.getCoords()[1,:,1], r0[1])), "Expected constant radius coordinate"
+
+  # Stopped worldlines must not loosen the tolerances of the remaining ones
+  orbit = circularOrbit(rs, 10*rs, 0.8)
+  reference = circularOrbit(rs, 10*rs, 0.8)
+  reference.geodesic(2000, 11, rtol = 1.0e-10, atol = 1.0e-12)
+  errors = []
+  for n in [1, 16]:
+    ensemble = wl.worldlineEnsemble(np.tile(orbit.coord0, (n,1)),
+                                    fv.fourvectorBatch(np.tile(orbit.velocity0.vector, (n,1)), orbit.velocity0.metric))
+    ensemble.geodesic(2000, 11, stopCondition = lambda x, v: np.arange(len(x)) > 0)
+    assert (np.all(np.isfinite(ensemble.stopTimes[1:])) and np.isinf(ensemble.stopTimes[0])), "Expected all but one worldline to stop"
+    errors.append(np.max(np.abs(ensemble.getCoords()[0]-reference.coords)))
+  assert (errors[1] <= errors[0]), "Remaining worldline should be at least as accurate as by itself"
+
+def test_geodesicSweep():
+
+  # Sweep over stable circular orbits, see test_geodesic
+  rs = 1.0
+  orbits = [circularOrbit(rs, r0) for r0 in np.linspace(10*rs, 50*rs, 7)]
+  coords0 = [orbit.coord0 for orbit in orbits]
+  velocities0 = [orbit.velocity0 for orbit in orbits]
+
+  # Results must be returned in input order
+  paths = wl.geodesicSweep(coords0, velocities0, 100, 10, maxWorkers = 2, chunkSize = 2)
+  assert (len(paths) == len(coords0)), "Expected one worldline per initial condition"
+  for i in range(len(paths)):
+    assert (np.allclose(np.array(paths[i].coords)[:,1], coords0[i][1])), "Expected constant radius coordinate"
+    assert (np.allclose(paths[i].velocities[-1].vector, velocities0[i].vector)), "Expected constant velocity"
+
+  # Streamed chunks must cover all initial conditions exactly once
+  starts = []
+  for start, chunk in wl.iterGeodesicSweep(coords0, velocities0, 100, 10, maxWorkers = 2, chunkSize = 3):
+    assert (len(chunk) == min(3, len(coords0)-start)), "Unexpected chunk length"
+    starts.append(start)
+  assert (sorted(starts) == [0,3,6]), "Unexpected chunks"
+
+  # Solver options are passed to the workers
+  paths = wl.geodesicSweep(coords0, velocities0, 100, 10, maxWorkers = 2, chunkSize = 4,
+                           method = 'DOP853', rtol = 1.0e-10, atol = 1.0e-12, denseOutput = False)
+  for i in range(len(paths)):
+    assert (paths[i].integralCurve is None), "Expected no dense output"
+    assert (paths[i].solverOptions['method'] == 'DOP853' and paths[i].solverOptions['rtol'] == 1.0e-10), "Unexpected solver options"
+    assert (np.allclose(paths[i].coords[:,1], coords0[i][1], rtol = 1.0e-9)), "Expected constant radius coordinate"
+
+def test_worldlineStorage():
+
+  # Radial infall from rest in Schwarzschild spacetime
+  rs = 1.0
+  r0 = 10*rs
+  theta0 = 0.5*np.pi
+  path = radialInfall(rs, r0)
+  vel0 = path.velocity0
+  nSteps = 1000
+  path.geodesic(10, nSteps)
+
+  # Worldline is stored as contiguous arrays
+  assert (path.curveparam.shape == (nSteps,)), "Unexpected shape of proper times"
+  assert (path.coords.shape == (nSteps,4) and path.coords.flags['C_CONTIGUOUS']), "Unexpected coordinate array"
+  assert (path.velocities.vectors.shape == (nSteps,4)), "Unexpected velocity array"
+  assert (len(path.velocities) == nSteps), "Unexpected number of velocities"
+
+  # Velocity fourvectors are created on demand with the metric evaluated along the worldline
+  for i in [0, nSteps//2, -1]:
+    vel = path.velocities[i]
+    assert (isinstance(vel, fv.observer)), "Expected observer type"
+    assert (np.array_equal(vel.vector, path.velocities.vectors[i])), "Unexpected velocity"
+    assert (vel.metric == mt.schwarzschild(rs, path.coords[i][1], path.coords[i][2])), "Metric not evaluated along worldline"
+    assert (np.isclose(vel.innerProduct(), 1)), "Expected normalised velocity"
+  assert (path.coords[-1][1] < r0), "Expected radial infall"
+  assert (len(path.velocities[10:20]) == 10), "Unexpected number of velocities in slice"
+  assert (vel0.getMetric().isFrozen()), "Integration should not replace the shared start metric"
+  assert (vel0.metric == mt.schwarzschild(rs,r0,theta0)), "Start velocity metric should not change"
+
+  # Without integration interval, the worldline consists of the start point only
+  for nSteps in [None, 5]:
+    path.geodesic(0, nSteps)
+    assert (np.array_equal(path.curveparam, [0])), "Expected single proper time"
+    assert (np.array_equal(path.coords, [[0,r0,theta0,0]])), "Expected start coordinates"
+    assert (np.array_equal(path.velocities.vectors, [vel0.vector])), "Expected start velocity"
+    assert (path.velocities[0].metric == vel0.metric), "Expected start metric"
+  path.extend(10, nSteps)
+  assert (len(path.curveparam) == 6 and path.coords[-1][1] < r0), "Expected extension from start point"
+  assert (np.allclose(path.integralCurve(path.curveparam)[0:4].T, path.coords)), "Expected dense output of extension"
+
+def test_geodesicChunks(tmp_path):
+
+  # Particle in stable orbit, see test_geodesic
+  rs = 1.0
+  path = circularOrbit(rs, 20*rs)
+  nSteps = 1001
+  path.geodesic(500, nSteps)
+
+  # Chunks must reproduce the stored worldline
+  chunks = list(path.geodesicChunks(500, nSteps, chunkSize = 64))
+  assert (len(chunks) == 16), "Unexpected number of chunks"
+  assert (all(len(tau) == 64 for tau, x, v in chunks[:-1])), "Unexpected chunk size"
+  tau = np.concatenate([chunk[0] for chunk in chunks])
+  x = np.concatenate([chunk[1] for chunk in chunks])
+  v = np.concatenate([chunk[2] for chunk in chunks])
+  assert (np.allclose(tau, path.curveparam)), "Unexpected proper times"
+  assert (np.allclose(x, path.coords)), "Unexpected coordinates"
+  assert (np.allclose(v, path.velocities.vectors)), "Unexpected velocities"
+
+  # A single sample is taken at the start, as in geodesic
+  path.geodesic(500, 1)
+  chunks = list(path.geodesicChunks(500, 1))
+  assert (len(chunks) == 1 and np.array_equal(chunks[0][0], path.curveparam) and path.curveparam[0] == 0), "Unexpected proper time"
+  assert (np.array_equal(chunks[0][1], path.coords) and np.array_equal(chunks[0][2], path.velocities.vectors)), "Unexpected sample"
+
+  # Chunks with other solvers and tolerances
+  path.geodesic(500, nSteps, method = 'DOP853', rtol = 1.0e-10, atol = 1.0e-12)
+  for method in ['DOP853', 'Radau']:
+    chunks = list(path.geodesicChunks(500, nSteps, chunkSize = 300, method = method, rtol = 1.0e-10, atol = 1.0e-12))
+    coords = np.concatenate([chunk[1] for chunk in chunks])
+    assert (np.allclose(coords, path.coords, rtol = 1.0e-8)), "Unexpected coordinates"
+
+  # Memory-mapped output must contain the same samples
+  filename = str(tmp_path / "orbit.npy")
+  output = path.geodesicToFile(filename, 500, nSteps, chunkSize = 100)
+  stored = np.load(filename)
+  assert (stored.shape == (nSteps,9)), "Unexpected shape of stored samples"
+  assert (np.array_equal(stored, np.asarray(output))), "Unexpected stored samples"
+  assert (np.allclose(stored[:,0], tau) and np.allclose(stored[:,1:5], x) and np.allclose(stored[:,5:9], v)), "Unexpected stored samples"
+
+  # Memory usage must be bounded by the chunk size, also if single solver steps
+  # cover most samples, as for a boosted observer in flat spacetime
+  vel0 = fv.observer([1,0,0,0], mt.minkowski())
+  vel0.lorentzBoost(1, 0.9)
+  path = wl.worldline([0,0,0,0], vel0)
+  tracemalloc.start()
+  try:
+    count = 0
+    for tau, x, v in path.geodesicChunks(1000, 2000000, chunkSize = 1000):
+      count += len(tau)
+    peak = tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+  assert (count == 2000000 and tau[-1] == 1000), "Expected all samples"
+  assert (np.allclose(x[-1], 1000*vel0.vector)), "Unexpected coordinates"
+  assert (peak < 4*10**6), "Memory usage should not grow with the number of samples"
+
+def test_geodesicEvents():
+
+  # Radial infall from rest in Schwarzschild spacetime must stop before the horizon
+  rs = 1.0
+  r0 = 5*rs
+  theta0 = 0.5*np.pi
+  path = radialInfall(rs, r0)
+  vel0 = path.velocity0
+  path.geodesic(100, 50, events = [wl.horizonEvent(rs, 0.01), wl.escapeEvent(10*rs)])
+  assert (path.event == 'horizon'), "Expected horizon event"
+  assert (path.eventTime < 100), "Expected integration to stop early"
+  assert (np.all(path.curveparam <= path.eventTime)), "Samples must end at the event"
+  assert (np.all(path.coords[:,1] >= 1.01*rs)), "Samples must stay outside of horizon"
+  assert (np.isclose(path.integralCurve(path.eventTime)[1], 1.01*rs)), "Event must be located accurately"
+
+  # The same trajectories in a parameter sweep with picklable events
+  paths = wl.geodesicSweep([[0,r0,theta0,0]]*2, [vel0]*2, 100, 50, maxWorkers = 1,
+                           events = [wl.horizonEvent(rs, 0.01)])
+  assert (all(p.event == 'horizon' and np.isclose(p.eventTime, path.eventTime) for p in paths)), "Expected horizon event"
+
+  # Outgoing radial photon escapes
+  vel0 = fv.photon([1,1-rs/r0,0,0], mt.schwarzschild(rs,r0,theta0), 1)
+  path = wl.worldline([0,r0,theta0,0], vel0)
+  path.geodesic(100, 50, events = [wl.horizonEvent(rs), wl.escapeEvent(10*rs)])
+  assert (path.event == 'escape'), "Expected escape event"
+  # Radial coordinate velocity of radial photons is constant, dr/ds = (1-rs/r)*dt/ds
+  assert (np.isclose(path.eventTime, 5*rs/(1-rs/r0))), "Unexpected affine parameter at escape radius"
+
+  # Photon moving towards the polar axis
+  r0 = 100*rs
+  theta0 = 0.1
+  vel0 = fv.photon([1,0,-np.sqrt(1-rs/r0)/r0,0], mt.schwarzschild(rs,r0,theta0), 1)
+  path = wl.worldline([0,r0,theta0,0], vel0)
+  path.geodesic(100, 50, events = [wl.polarAxisEvent()])
+  assert (path.event == 'polar axis'), "Expected polar axis event"
+  assert (np.all(path.coords[:,2] > 0)), "Samples must end before the polar axis"
+
+  # User-defined events
+  path = wl.worldline([0,r0,theta0,0], vel0)
+  path.geodesic(100, 50, events = [wl.geodesicEvent(lambda s, x: x[0]-5, 'time', direction = 1)])
+  assert (path.event == 'time'), "Expected user-defined event"
+
+  # No event fires
+  path.geodesic(1, 50, events = [wl.polarAxisEvent()])
+  assert (path.event is None and path.eventTime is None), "Expected no event"
+  assert (np.isclose(path.curveparam[-1], 1)), "Expected integration to the end"
+
+def test_integratorOptions():
+
+  # Stable circular orbit, see test_geodesic
+  rs = 1.0
+  r0 = 10*rs
+  path = circularOrbit(rs, r0)
+  vt0, vphi0 = path.velocity0.vector[[0,3]]
+  for method in ['RK23', 'RK45', 'DOP853', 'Radau', 'BDF', 'LSODA']:
+    path.geodesic(100, 11, method = method, rtol = 1.0e-8, atol = 1.0e-10)
+    assert (np.allclose(path.coords[:,1], r0)), "Expected constant radius coordinate"
+    assert (np.allclose(path.coords[:,3], path.curveparam*vphi0)), "Expected constant orbital coordinate velocity"
+    assert (np.allclose(path.accelerations(path.curveparam), 0, atol = 1.0e-6)), "Four-acceleration should vanish"
+
+  # Without dense output, only samples are available
+  path.geodesic(100, 11, method = 'DOP853', denseOutput = False)
+  assert (path.integralCurve is None), "Expected no dense output"
+  assert (len(path.curveparam) == 11), "Expected samples"
+  with pytest.raises(AssertionError):
+    path.acceleration(50)
+
+def test_projection():
+
+  # Eccentric orbit in Schwarzschild spacetime at loose tolerances
+  rs = 1.0
+  r0 = 10*rs
+  theta0 = 0.5*np.pi
+  path = circularOrbit(rs, r0, 0.8)
+  vt0, vphi0 = path.velocity0.vector[[0,3]]
+  path.geodesic(2000, 200, rtol = 1.0e-3, atol = 1.0e-6)
+  drift = np.max(np.abs(path.diagnostics()['constraintDrift']))
+  path.geodesic(2000, 200, rtol = 1.0e-3, atol = 1.0e-6, project = True)
+  diagnostics = path.diagnostics()
+  assert (len(path.curveparam) == 200), "Expected all samples"
+  assert (np.max(np.abs(diagnostics['constraintDrift'])) < 1.0e-12), "Velocity should stay on mass shell"
+  assert (drift > 1.0e-6), "Expected constraint drift without projection"
+  # Loose tolerances still conserve energy and angular momentum approximately
+  assert (np.allclose(diagnostics['energy'], (1-rs/r0)*vt0, rtol = 1.0e-2)), "Expected conserved energy"
+  assert (np.allclose(diagnostics['angularMomentum'], r0*r0*vphi0, rtol = 1.0e-1)), "Expected conserved angular momentum"
+  # Dense output must match samples up to the projection
+  assert (np.allclose(path.integralCurve(path.curveparam)[0:4].T, path.coords)), "Unexpected dense output"
+
+  # Photon with terminal events, samples end at event
+  vel0 = fv.photon([1,0,0,np.sqrt(1-rs/r0)/r0], mt.schwarzschild(rs,r0,theta0), 1)
+  path = wl.worldline([0,r0,theta0,0], vel0)
+  path.geodesic(50, 20, events = [wl.horizonEvent(rs), wl.escapeEvent(3*r0)], project = True)
+  assert (path.event == 'escape'), "Expected escape event"
+  assert (np.isclose(path.integralCurve(path.eventTime)[1], 3*r0)), "Event must be located accurately"
+  assert (np.all(path.curveparam <= path.eventTime)), "Samples must end at the event"
+  assert (np.max(np.abs(path.diagnostics()['constraintDrift'])) < 1.0e-12), "Velocity should stay on null cone"
+
+  # Without sampling times, all steps are stored
+  path.geodesic(10, project = True)
+  assert (np.array_equal(path.curveparam, path.integralCurve.ts)), "Expected solver steps"
+
+  # Minkowski momenta
+  vel0 = fv.observer([1,0,0,0], mt.minkowski())
+  path = wl.worldline([0,0,0,0], vel0)
+  path.geodesic(10, 5, project = True)
+  diagnostics = path.diagnostics()
+  assert (np.allclose(diagnostics['energy'], 1) and np.allclose(diagnostics['momentum'], 0)), "Expected conserved momentum"
+
+def test_extend():
+
+  # Eccentric orbit in Schwarzschild spacetime, see test_projection
+  rs = 1.0
+  r0 = 10*rs
+  reference = circularOrbit(rs, r0, 0.8)
+  reference.geodesic(2000, 201, rtol = 1.0e-8, atol = 1.0e-10)
+
+  # Extending in steps must reproduce a single integration at about the same cost
+  path = circularOrbit(rs, r0, 0.8)
+  path.geodesic(1000, 101, rtol = 1.0e-8, atol = 1.0e-10)
+  path.extend(500, 50)
+  path.extend(500, 50)
+  assert (np.allclose(path.curveparam, reference.curveparam)), "Unexpected proper times"
+  assert (np.allclose(path.coords, reference.coords, atol = 1.0e-5)), "Unexpected coordinates"
+  assert (np.allclose(path.velocities.vectors, reference.velocities.vectors, atol = 1.0e-5)), "Unexpected velocities"
+  assert (path.velocities[-1].metric == reference.velocities[-1].metric), "Unexpected metric"
+  assert (np.isclose(path.integralCurve.ts[-1], 2000)), "Dense output must cover whole worldline"
+  properTimes = np.linspace(0, 2000, 333)
+  assert (np.allclose(path.integralCurve(properTimes), reference.integralCurve(properTimes), atol = 1.0e-5)), "Unexpected dense output"
+  assert (path.stats['solver.nfev'] < 1.1*reference.stats['solver.nfev']), "Extension should not repeat earlier work"
+  assert (path.stats['solver.steps'] == len(path.integralCurve.ts)-1), "Expected accumulated statistics"
+
+  # Without sampling times, solver steps are appended without duplicating the previous end
+  path.geodesic(100, project = True)
+  path.extend(100, reuseStep = False)
+  assert (np.all(np.diff(path.curveparam) > 0)), "Proper times must increase"
+  assert (np.array_equal(path.curveparam, path.integralCurve.ts)), "Expected solver steps"
+  assert (np.max(np.abs(path.diagnostics()['constraintDrift'])) < 1.0e-12), "Velocity should stay on mass shell"
+
+  # Extension stops at terminal events and continues from them
+  path = radialInfall(rs, 5*rs)
+  path.geodesic(100, 10, events = [wl.escapeEvent(10*rs), wl.horizonEvent(rs, 1.0)])
+  assert (path.event == 'horizon' and np.isclose(path.endState[1], 2*rs)), "Expected horizon event"
+  path.extend(100, 10, events = [wl.horizonEvent(rs, 0.01)])
+  assert (path.event == 'horizon' and np.isclose(path.endState[1], 1.01*rs)), "Expected horizon event"
+  assert (np.all(path.coords[:,1] >= 1.01*rs)), "Samples must stay outside of horizon"
+
+def test_resample():
+
+  # Stable circular orbit, see test_geodesic
+  rs = 1.0
+  r0 = 10*rs
+  path = circularOrbit(rs, r0)
+  vt0, vphi0 = path.velocity0.vector[[0,3]]
+  path.geodesic(1000, 11, rtol = 1.0e-10, atol = 1.0e-12)
+
+  # Resampling at stored proper times must reproduce stored samples
+  properTimes, coords, velocities = path.resample(path.curveparam)
+  assert (np.array_equal(properTimes, path.curveparam)), "Unexpected proper times"
+  assert (np.allclose(coords, path.coords) and np.allclose(velocities, path.velocities.vectors)), "Unexpected samples"
+
+  # Coordinate time t = tau*t' along the orbit
+  times = np.linspace(0, path.coords[-1,0], 1001)
+  properTimes, coords, velocities, matrices, christoffels = path.resample(times, coordinateTime = True, metrics = True)
+  assert (np.allclose(properTimes, times/vt0)), "Unexpected proper times"
+  assert (np.allclose(coords[:,0], times, rtol = 0, atol = 1.0e-9)), "Unexpected coordinate times"
+  assert (np.allclose(coords[:,3], times/vt0*vphi0)), "Unexpected orbital angle"
+  assert (coords.shape == (1001,4) and velocities.shape == (1001,4)), "Unexpected shapes"
+  for i in [0, 500, 1000]:
+    metric = mt.schwarzschild(rs, coords[i,1], coords[i,2])
+    assert (np.allclose(matrices[i], metric.getMatrix())), "Unexpected matrix"
+    assert (np.allclose(christoffels[i], metric.getChristoffel())), "Unexpected Christoffel symbols"
+
+  # Times outside of the worldline are rejected
+  with pytest.raises(AssertionError):
+    path.resample([1001.0])
+  with pytest.raises(AssertionError):
+    path.resample([-1.0], coordinateTime = True)